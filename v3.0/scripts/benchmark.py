@@ -0,0 +1,256 @@
+"""
+Benchmarks for the hot paths: page parsing, data cleaning, item pipeline
+and database update/search. Pages are generated from card templates by
+default. Sanitized real pages saved in FIXTURES_PATH (none are committed
+yet) are used instead for their sites. Results are appended to
+BENCHMARK_RESULTS with the current commit, and compared with the previous
+run to report regressions.
+Usage: python benchmark.py [num_rows ...]   (default: 1000 100000)
+       python benchmark.py --save-fixtures [site ...]
+1000000 rows isn't a default since building that table (with the MinHash
+bands of every row) takes about ten minutes; pass it to measure it. The
+second form saves fixtures from a few pages of the page archive of a crawl.
+"""
+import os
+import sys
+import json
+import shutil
+import timeit
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+from statistics import median
+import pandas as pd
+from lxml import etree
+#pylint: disable=import-error
+import project_constants as prc
+from utils.data_cleaner import select_data_cleaner
+from utils.fingerprint import get_band_keys, get_fingerprint, get_minhash
+from utils.page_archive import PageArchive
+from utils.sql_control import DBControl
+from utils.web_control import CARD_FIELDS, extract_cards, select_website_control
+from site_scraper.pipelines import SiteScraperPipeline
+from site_scraper.spiders.basic import BasicSpider
+#pylint: enable=import-error
+
+BENCHMARK_RESULTS = "benchmarks.jsonl"
+FIXTURES_PATH = "benchmark_fixtures"
+FIXTURES_PER_SITE = 3
+#Elements and attributes kept in the fixtures. The rest (scripts, styles,
+#tracking and session data) isn't needed to parse the cards
+FIXTURE_DROP_TAGS = ['script', 'style', 'noscript', 'iframe', 'svg', 'link',
+                     'meta', 'img', 'form', 'input', 'button']
+FIXTURE_KEEP_ATTRIBUTES = {'class', 'id', 'href', 'title', 'aria-label'}
+REGRESSION_THRESHOLD = 0.2
+REPEAT = 5
+CARDS_PER_PAGE = 20
+#Card templates with the structure that each site control expects
+CARD_TEMPLATES = {
+    'Bumeran': ('<div><a href="/empleos/oferta-{n}.html"><div>'
+                '<div class="sc-a"><h2 class="sc-job">Practicante eléctrico {n}'
+                '</h2><h3 class="sc-company">Empresa {n} S.A.C.</h3>'
+                '<h3 class="sc-x">x</h3><h3 class="sc-date">Publicado hace 2 '
+                'días</h3></div><div class="sc-b"><h3 class="sc-location">'
+                'Lima, Lima</h3></div></div></a></div>'),
+    'Computrabajo': ('<article class="box_offer"><h1><a class="js-o-link" '
+                     'href="/ofertas-de-trabajo/oferta-{n}">Ingeniero de '
+                     'mantenimiento {n}</a></h1><div><p class="fs16">\n'
+                     '<a class="fc_base">Empresa {n}</a>\n<span>Lima, San '
+                     'Isidro</span></p><p>x</p><p class="fs13">Hace 3 días</p>'
+                     '</div></article>'),
+    'Indeed': ('<a class="tapItem" href="/rc/clk?jk={n}"><h2 class="jobTitle">'
+               '<span>Trainee de proyectos {n}</span></h2><span class='
+               '"companyName">Empresa {n}</span><div class="companyLocation">'
+               'Arequipa</div><span class="date">Hace 4 días</span></a>')}
+
+#####################################
+##Fixtures
+def generate_fixture_page(site, num_cards = CARDS_PER_PAGE):
+    """Generate a result page for a site"""
+    cards = "".join(CARD_TEMPLATES[site].format(n = n)
+                    for n in range(num_cards))
+    return "<html><body>" + cards + "</body></html>"
+
+def sanitize_page(page_source):
+    """Remove scripts, styles, comments and the attributes that aren't used
+    by the xPaths from a page"""
+    root = etree.fromstring(page_source, etree.HTMLParser())
+    etree.strip_elements(root, *FIXTURE_DROP_TAGS, etree.Comment,
+                         with_tail = False)
+    for element in root.iter(etree.Element):
+        for attribute in list(element.attrib):
+            if attribute not in FIXTURE_KEEP_ATTRIBUTES:
+                del element.attrib[attribute]
+    return etree.tostring(root, encoding = 'unicode', method = 'html')
+
+def save_fixtures(sites):
+    """Replace the fixtures of the sites with the first sanitized pages of
+    the page archive. Returns the number of pages saved by site"""
+    archive = PageArchive(prc.ARCHIVE_PATH)
+    fixtures = PageArchive(FIXTURES_PATH)
+    #Fixtures of other sites are kept
+    entries = [entry for entry in fixtures.read_index()
+               if entry['site'] not in sites]
+    for site in sites:
+        shutil.rmtree(os.path.join(FIXTURES_PATH, site), ignore_errors = True)
+    os.makedirs(FIXTURES_PATH, exist_ok = True)
+    with open(os.path.join(FIXTURES_PATH, PageArchive.INDEX_NAME), 'w',
+              encoding = 'utf-8') as file:
+        file.writelines(json.dumps(entry) + '\n' for entry in entries)
+    num_pages = dict()
+    for site in sites:
+        num_pages[site] = 0
+        for entry, page_source in archive.iter_pages([site]):
+            if num_pages[site] == FIXTURES_PER_SITE:
+                break
+            fixtures.save_page(site, entry['keyword'], entry['page'],
+                               sanitize_page(page_source), entry['x_paths'])
+            num_pages[site] += 1
+    return num_pages
+
+def get_fixture_pages(site):
+    """Get (x_paths, page_source) tuples for a site, from the committed
+    fixtures, or generated if there aren't any"""
+    fixtures = PageArchive(FIXTURES_PATH)
+    pages = [(entry['x_paths'], page_source)
+             for entry, page_source in fixtures.iter_pages([site])]
+    if not pages:
+        print(site + ": No fixtures, using generated pages")
+        ctl = select_website_control({'site': site, 'options': {}})
+        page_source = generate_fixture_page(site)
+        ctl.update_xpaths(page_source)
+        pages = [(dict(ctl.x_paths), page_source)]
+    return pages
+
+def generate_rows(num_rows):
+    """Generate rows for the Data table, ordered as DBControl.DATA_COLUMNS"""
+    today = datetime.now().date()
+    jobs = ['practicante eléctrico', 'ingeniero de mantenimiento',
+            'trainee de proyectos', 'operario de mina', 'contador']
+    rows = [(jobs[n % len(jobs)] + " " + str(n), "empresa " + str(n % 997),
+             "lima", str(today - timedelta(days = n % 30)),
+             prc.ALLOWED_SITES[n % len(prc.ALLOWED_SITES)], 0,
+             "https://example.com/" + str(n))
+            for n in range(num_rows)]
+    return [row + (get_fingerprint(*row[:3]),) for row in rows]
+
+def fill_data_tbl(dbc, rows):
+    """Insert rows in the data table as already checked for duplicates,
+    with their MinHash bands, without searching the duplicates of each one
+    (upsert_data_rows would, which takes minutes for large tables)"""
+    columns = DBControl.DATA_COLUMNS
+    sql_query = "INSERT INTO Data ({}, duplicate_of) VALUES ({}, 0);".format(
+        ", ".join(columns), ", ".join("?"*len(columns)))
+    job, company, link = (columns.index(column)
+                          for column in ('job', 'company', 'link'))
+    with dbc.connection:
+        dbc.cursor.executemany(sql_query, rows)
+        dbc.cursor.executemany(
+            """INSERT INTO DataBands (band, data_id, date)
+            SELECT ?, id, date FROM Data WHERE link = ?;""",
+            [(band_key, row[link]) for row in rows
+             for band_key in get_band_keys(get_minhash(row[job],
+                                                       row[company]))])
+
+#####################################
+##Timing
+def time_function(function, repeat = REPEAT):
+    """Run a function several times, returning the median seconds"""
+    return median(timeit.repeat(function, number = 1, repeat = repeat))
+
+def benchmark_parsing(results):
+    """Time process_page, the cleaners and the pipeline for each site"""
+    for site in prc.ALLOWED_SITES:
+        pages = get_fixture_pages(site)
+        spider = BasicSpider.create_offline(site)
+        results[site + '.process_page'] = time_function(
+            lambda: [list(spider.process_page(page_source, x_paths))
+                     for x_paths, page_source in pages])
+        cards = [card for x_paths, page_source in pages
+                 for card in extract_cards(page_source, x_paths)]
+        cleaner = select_data_cleaner(site)
+        for field in CARD_FIELDS:
+            clean = getattr(cleaner, 'clean_' + field)
+            results[site + '.clean_' + field] = time_function(
+                lambda: [clean(card[field]) for card in cards])
+        items = [item for x_paths, page_source in pages
+                 for item in spider.process_page(page_source, x_paths)]
+        raw_items = pd.DataFrame([dict(item) for item in items])
+        results[site + '.clean_batch'] = time_function(
+            lambda: cleaner.clean_batch(raw_items))
+        results[site + '.process_item'] = time_function(
+            lambda: [SiteScraperPipeline.process_item(item.deepcopy(), spider)
+                     for item in items])
+
+def benchmark_database(results, num_rows, directory):
+    """Time data table updates and searches with num_rows in the table"""
+    dbc = DBControl()
+    dbc.DATABASE_PATH = directory + os.sep
+    dbc.connect_and_check_db("benchmark_{}.db".format(num_rows), clear = True)
+    fill_data_tbl(dbc, generate_rows(num_rows))
+    #Update with a batch of new and existing rows, through a CSV
+    csv_name = os.path.join(directory, "benchmark.csv")
+    new_rows = generate_rows(num_rows + 1000)[-2000:]
+    pd.DataFrame(new_rows, columns = DBControl.DATA_COLUMNS).to_csv(
+        csv_name, index = False)
+    results['update_data_tbl.{}'.format(num_rows)] = time_function(
+        lambda: dbc.update_data_tbl(csv_name))
+    with contextlib.redirect_stdout(None):
+        results['search_in_data_tbl.{}'.format(num_rows)] = time_function(
+            lambda: dbc.search_in_data_tbl(prc.MAX_PAST_DAYS,
+                                           prc.KEYWORDS_AND,
+                                           prc.KEYWORDS_OR,
+                                           only_non_opened = True))
+    dbc.connection.close()
+
+#####################################
+##Results
+def get_commit():
+    """Get the current git commit, if any"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output = True, text = True,
+                              check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def get_previous_results(path):
+    """Get the results of the last recorded run"""
+    previous = dict()
+    if os.path.isfile(path):
+        with open(path, 'r', encoding = 'utf-8') as file:
+            for line in file:
+                previous = json.loads(line)['results']
+    return previous
+
+def report_results(results, previous):
+    """Print results and the regressions with respect to the previous run"""
+    for name, seconds in results.items():
+        line = "{:<40} {:>12.6f} s".format(name, seconds)
+        if name in previous and previous[name] > 0:
+            change = seconds/previous[name] - 1
+            line += "  {:+.1%}".format(change)
+            if change > REGRESSION_THRESHOLD:
+                line += "  REGRESSION"
+        print(line)
+
+if __name__ == "__main__" and sys.argv[1:2] == ['--save-fixtures']:
+    for SITE, NUM in save_fixtures(sys.argv[2:] or prc.ALLOWED_SITES).items():
+        print(SITE + ": Fixture pages saved: ", NUM)
+elif __name__ == "__main__":
+    NUM_ROWS = [int(x) for x in sys.argv[1:]] or [1000, 100000]
+    RESULTS = dict()
+    benchmark_parsing(RESULTS)
+    DIRECTORY = tempfile.mkdtemp()
+    try:
+        for num in NUM_ROWS:
+            benchmark_database(RESULTS, num, DIRECTORY)
+    finally:
+        shutil.rmtree(DIRECTORY)
+    report_results(RESULTS, get_previous_results(BENCHMARK_RESULTS))
+    with open(BENCHMARK_RESULTS, 'a', encoding = 'utf-8') as FILE:
+        FILE.write(json.dumps({'commit': get_commit(),
+                               'date': datetime.now().isoformat(
+                                   timespec = 'seconds'),
+                               'results': RESULTS}) + '\n')
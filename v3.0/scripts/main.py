@@ -6,7 +6,11 @@ from scrapy.crawler import CrawlerProcess
 from scrapy.settings import Settings
 #pylint: disable=import-error
 import project_constants as prc
+from utils.checkpoint import CrawlCheckpoint
 from utils.sql_control import DBControl
+from utils.link_index import SeenLinkIndex
+from utils.metrics import CrawlMetrics
+from utils.query_planner import QueryPlanner, SearchStats
 from site_scraper import settings as basic_settings
 from site_scraper.spiders.basic import BasicSpider
 #pylint: enable=import-error
@@ -16,6 +20,11 @@ def run_crawler_process(parameter_array):
     crawler_settings = Settings()
     crawler_settings.setmodule(basic_settings)
     crawler_settings.setdict(prc.EXTRA_CRAWLER_SETTINGS)
+    if not prc.UPDATE_DB:
+        #Scraped items are stored in DB by a pipeline, only when updating
+        pipelines = crawler_settings.getdict('ITEM_PIPELINES')
+        pipelines.pop(prc.STORE_PIPELINE, None)
+        crawler_settings.set('ITEM_PIPELINES', pipelines)
     process = CrawlerProcess(settings = crawler_settings)
     for parameters in parameter_array:
         process.crawl(BasicSpider, parameters = parameters)
@@ -26,30 +35,76 @@ if __name__ == "__main__":
     OPTIONS = {'max_pages':prc.MAX_PAGES, 'headless':prc.HEADLESS}
     KEYWORDS = prc.KEYWORDS
     DATE_LIMIT = prc.DATE_LIMIT
+    #Timing spans of every site go to the same files
+    METRICS = CrawlMetrics(prc.METRICS_SPANS_NAME, prc.METRICS_PROMETHEUS_NAME)
+    #Searches done by an interrupted crawl of today are skipped or resumed
+    CHECKPOINT = CrawlCheckpoint.load(prc.CHECKPOINT_NAME)
+    #Links found by each keyword/site search, stored for the query planner
+    SEARCH_STATS = SearchStats()
     #Parameter object: keywords to search, site to search, date_limit for
-    #the group of keywords, and options for webpage control
+    #the group of keywords, fetch mode and options for webpage control
     #This should be obtained from the program
     PARAMETER_ARRAY = [{'keywords': KEYWORDS,
                        'site': x,
                        'date_lim': DATE_LIMIT,
-                       'options': OPTIONS} for x in prc.ALLOWED_SITES]
-    #Scrape and replace csv if parameter is true
+                       'fetch_mode': prc.FETCH_MODES.get(x, 'selenium'),
+                       'metrics': METRICS,
+                       'checkpoint': CHECKPOINT,
+                       'search_stats': SEARCH_STATS,
+                       'options': dict(OPTIONS,
+                                       pool_size=prc.POOL_SIZES.get(x, 1),
+                                       tabs=prc.TAB_COUNTS.get(x, 1),
+                                       timeout=prc.SITE_TIMEOUTS.get(x))}
+                       for x in prc.ALLOWED_SITES]
+    #Plan keywords and page budgets of each site from the previous runs
+    if prc.USE_QUERY_PLANNER and prc.SCRAPE_CSV:
+        dbc = DBControl()
+        dbc.connect_and_check_db(prc.DB_NAME, clear = False)
+        PLANNER = QueryPlanner.load(dbc, max_pages=prc.MAX_PAGES,
+                                    num_runs=prc.PLANNER_RUNS,
+                                    merge_overlap=prc.PLANNER_MERGE_OVERLAP,
+                                    min_pages=prc.PLANNER_MIN_PAGES,
+                                    extra_pages=prc.PLANNER_EXTRA_PAGES,
+                                    reprobe_days=prc.PLANNER_REPROBE_DAYS)
+        dbc.connection.close()
+        for parameters in PARAMETER_ARRAY:
+            plan = PLANNER.plan_site(parameters['site'], KEYWORDS)
+            PLANNER.print_plan(parameters['site'], plan)
+            parameters['keywords'] = plan['keywords']
+            parameters['options']['page_budgets'] = plan['page_budgets']
+    #Scrape (and update data table) if parameter is true
     if prc.SCRAPE_CSV:
-        #Delete csv if exists
-        if os.path.exists(prc.CSV_NAME):
+        #Delete csv if exists and it will be replaced (not when resuming)
+        if (prc.EXPORT_CSV and os.path.exists(prc.CSV_NAME)
+                and not CHECKPOINT):
             os.remove(prc.CSV_NAME)
+        #Seed the seen link index with the links in DB the first time
+        if not os.path.exists(prc.SEEN_INDEX_NAME):
+            dbc = DBControl()
+            dbc.connect_and_check_db(prc.DB_NAME, clear = False)
+            SeenLinkIndex(prc.SEEN_INDEX_NAME).rebuild(dbc.get_data_links())
+            dbc.connection.close()
         #Create crawler and begin scraping
         run_crawler_process(PARAMETER_ARRAY)
+        #Next crawl starts from scratch if every search was completed
+        if CHECKPOINT.is_complete(PARAMETER_ARRAY):
+            CHECKPOINT.clear()
+        else:
+            print("Crawl not completed, next run will resume it")
     #Connect to DB if it will be used for something
     if prc.UPDATE_DB or prc.SEARCH_DB:
         #Create DB connection
         dbc = DBControl()
         dbc.connect_and_check_db(prc.DB_NAME, clear = False)
-    #Update SQL database with CSV if parameter is true
+    #Update search table (and the stats of the searches) if parameter is
+    #true. Data table is updated while scraping
     if prc.UPDATE_DB:
-        #Update tables
-        dbc.update_data_tbl(prc.CSV_NAME)
-        dbc.update_search_tbl(dbc.generate_keyword_dict(prc.KEYWORDS))
+        if SEARCH_STATS.get_searched():
+            dbc.save_search_stats(SEARCH_STATS)
+            dbc.update_search_tbl(SEARCH_STATS.get_searched())
+        else:
+            dbc.update_search_tbl(
+                dbc.generate_keyword_dict(prc.KEYWORDS).items())
     #Search in DB - Parameters and conversion
     if prc.SEARCH_DB:
         dbc.open_search_results()
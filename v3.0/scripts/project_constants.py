@@ -14,6 +14,8 @@ KW_B = []
 KW_2 = KW_A
 KEYWORDS_OR = [x.lower().strip() for x in KW_2]
 ONLY_NON_OPENED = True
+#Leave out postings that are duplicates of a posting from another site
+HIDE_DUPLICATES = True
 ##################################
 #Program parameters
 #Scraping parameters
@@ -24,16 +26,97 @@ KEYWORDS = KWM_NORMAL
 DATE_LIMIT = 1
 HEADLESS = True
 MAX_PAGES = 50
+#Query planner: plans the keywords of each site from the links found in
+#their last PLANNER_RUNS runs. Keywords whose links are mostly (overlap)
+#found by another keyword are merged into it, the ones without new links
+#are skipped, and page budgets go up to the last page with new links plus
+#PLANNER_EXTRA_PAGES. Every keyword is searched in full again after
+#PLANNER_REPROBE_DAYS without being searched
+USE_QUERY_PLANNER = True
+PLANNER_RUNS = 3
+PLANNER_MERGE_OVERLAP = 0.9
+PLANNER_MIN_PAGES = 2
+PLANNER_EXTRA_PAGES = 2
+PLANNER_REPROBE_DAYS = 7
+#Headless drivers working in parallel for each site
+POOL_SIZES = {'Bumeran': 2, 'Computrabajo': 2, 'Indeed': 1}
+#Browser tabs loading the pages of a search at the same time, for each
+#site (one browser per driver of the pool)
+TAB_COUNTS = {'Bumeran': 3, 'Computrabajo': 3, 'Indeed': 1}
+#Seconds after which the pending searches of a site are cancelled (None
+#waits for all of them)
+SITE_TIMEOUTS = {'Bumeran': None, 'Computrabajo': None, 'Indeed': None}
+#Fetch mode for each site: 'selenium' or 'http' (scrapy downloader only,
+#for the sites that support it)
+FETCH_MODES = {'Bumeran': 'selenium', 'Computrabajo': 'http',
+               'Indeed': 'http'}
+#Time budgets (seconds) for readiness waits: elements, popups/extras, DOM
+#idle (no elements added or removed), and the quiet period (ms) that counts
+#as idle
+WAIT_BUDGETS = {
+        'Bumeran': {'element': 10, 'extras': 15, 'idle': 5, 'quiet_ms': 300},
+        'Computrabajo': {'element': 10, 'extras': 10, 'idle': 3,
+                         'quiet_ms': 200},
+        'Indeed': {'element': 10, 'extras': 5, 'idle': 3, 'quiet_ms': 200}}
 #Database parameters
 DB_NAME = "testDB.db"
 CSV_NAME = "items.csv"
+#Scraped items are stored in DB in batches of this size
+DB_BATCH_SIZE = 200
+#Hashed links already scraped, to drop known postings while crawling
+SEEN_INDEX_NAME = "seen_links.idx"
+#Card xPaths discovered for each site, reused while the page structure
+#doesn't change and they are not older than the TTL
+XPATH_CACHE_NAME = "xpath_cache.json"
+XPATH_CACHE_TTL_HOURS = 24
+#Archive of raw result pages (gzipped), for replay.py
+ARCHIVE_PAGES = True
+ARCHIVE_PATH = "page_archive"
+#Journal of the crawl progress, to resume interrupted crawls on the same day
+CHECKPOINT_NAME = "crawl_checkpoint.jsonl"
+#Timing spans of the crawl (JSON lines) and their histograms (Prometheus
+#text format)
+METRICS_SPANS_NAME = "metrics_spans.jsonl"
+METRICS_PROMETHEUS_NAME = "metrics.prom"
+#CSV export of the scraped items, only for debugging (DB is updated
+#directly by the item pipeline)
+EXPORT_CSV = False
 BOOLEANS_0 = (True, True, True)
 BOOLEANS_1 = (True, True, False)
 BOOLEANS_2 = (False, False, True)
 SCRAPE_CSV, UPDATE_DB, SEARCH_DB = BOOLEANS_0
+#Postings from other links or sites are duplicates when they have the same
+#job/company/city, or similar ones (estimated Jaccard similarity), within
+#a window of days
+DEDUP_SIMILARITY = 0.8
+DEDUP_DATE_WINDOW = 3
 ##################################
 #Program constants and settings
 CHROMEDRIVER_PATH = r"C:\Program Files\chromedriver_win32\chromedriver.exe"
+#Resources that Selenium sessions don't load for each site: types (image,
+#font, media, stylesheet) and allowed domains (None allows all). Other
+#domains are blocked once a page requests them
+RESOURCE_BLOCKING = {
+    'Bumeran': {'types': ['image', 'font', 'media'],
+                'allowed_domains': ['bumeran.com.pe', 'bumeran.com',
+                                    'naventcdn.com']},
+    'Computrabajo': {'types': ['image', 'font', 'media'],
+                     'allowed_domains': ['computrabajo.com.pe',
+                                         'computrabajo.com']},
+    'Indeed': {'types': ['image', 'font', 'media'],
+               'allowed_domains': ['indeed.com']}}
+#Driver daemon (run_driver_daemon.py) with warm browser sessions for each
+#site. Crawlers start their own browser if it isn't running
+USE_DRIVER_DAEMON = False
+CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
+DAEMON_ADDRESS = ('127.0.0.1', 6001)
+#File with the key of the running daemon (generated when it starts)
+DAEMON_AUTHKEY_NAME = "driver_daemon.key"
+DAEMON_PROFILES_PATH = "driver_profiles"
+#Sessions are recycled above this browser memory use (MB, resident memory
+#of Chrome and its child processes) or number of leases
+DAEMON_MEMORY_LIMIT_MB = 512
+DAEMON_MAX_LEASES = 50
 USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
               'AppleWebKit/537.36 (KHTML, like Gecko)',
               ' Chrome/96.0.4664.110 Safari/537.36')
@@ -42,8 +125,14 @@ ALLOWED_SITES = ['Bumeran', 'Computrabajo', 'Indeed']
 FEED_FORMAT = 'csv'
 FEED_URI = CSV_NAME
 LOG_ENABLED = 'False'
+#Asyncio reactor, so Selenium searches are awaited in threads and every
+#site is crawled at the same time
+TWISTED_REACTOR = 'twisted.internet.asyncioreactor.AsyncioSelectorReactor'
 EXTRA_CRAWLER_SETTINGS = {
         'USER_AGENT': 'Chrome/96.0.4664.110 Safari/537.36',
-        'FEED_FORMAT': FEED_FORMAT,
-        'FEED_URI': FEED_URI,
-        'LOG_ENABLED': LOG_ENABLED}
+        'LOG_ENABLED': LOG_ENABLED,
+        'TWISTED_REACTOR': TWISTED_REACTOR}
+if EXPORT_CSV:
+    EXTRA_CRAWLER_SETTINGS.update({'FEED_FORMAT': FEED_FORMAT,
+                                   'FEED_URI': FEED_URI})
+STORE_PIPELINE = 'site_scraper.pipelines.SQLiteStorePipeline'
@@ -0,0 +1,45 @@
+"""
+Replays archived pages through the spider parsing and the batch cleaners,
+without a browser or network. Useful after changing cleaners or xPaths.
+Usage: python replay.py [site ...]
+"""
+import sys
+from datetime import datetime
+import pandas as pd
+#pylint: disable=import-error
+import project_constants as prc
+from utils.data_cleaner import select_data_cleaner
+from utils.page_archive import PageArchive
+from utils.sql_control import DBControl
+from site_scraper.spiders.basic import BasicSpider
+#pylint: enable=import-error
+
+def replay_archive(archive, sites):
+    """Parse, clean and store every archived page of the sites. Pages are
+    cleaned in one batch per archive date, since relative dates are counted
+    from the day the page was archived. Known links are not dropped, so
+    stored rows get the new values. Returns the number of items stored"""
+    num_items = 0
+    dbc = DBControl()
+    dbc.connect_and_check_db(prc.DB_NAME, clear = False)
+    for site in sites:
+        spider = BasicSpider.create_offline(site)
+        cleaner = select_data_cleaner(site)
+        batches = dict()
+        for entry, page_source in archive.iter_pages([site]):
+            archived_on = datetime.fromisoformat(entry['archived_at']).date()
+            batches.setdefault(archived_on, list()).extend(
+                dict(item) for item in spider.process_page(page_source,
+                                                           entry['x_paths']))
+        for archived_on, items in batches.items():
+            cleaned = cleaner.clean_batch(pd.DataFrame(items), today = archived_on)
+            dbc.upsert_data_rows(cleaned[list(DBControl.DATA_COLUMNS)].itertuples(
+                index = False, name = None))
+            num_items += len(cleaned)
+    dbc.connection.close()
+    return num_items
+
+if __name__ == "__main__":
+    SITES = sys.argv[1:] or prc.ALLOWED_SITES
+    NUM_ITEMS = replay_archive(PageArchive(prc.ARCHIVE_PATH), SITES)
+    print("Items replayed: ", NUM_ITEMS)
@@ -0,0 +1,23 @@
+"""
+Runs the driver daemon, which keeps warm headless browser sessions for each
+site (POOL_SIZES of them) between crawls. Set USE_DRIVER_DAEMON to lease
+them from main.py.
+Usage: python run_driver_daemon.py
+"""
+#pylint: disable=import-error
+import project_constants as prc
+from utils.driver_daemon import DriverDaemon
+#pylint: enable=import-error
+
+if __name__ == "__main__":
+    DAEMON = DriverDaemon(prc.DAEMON_ADDRESS, prc.DAEMON_AUTHKEY_NAME,
+                          chrome_path = prc.CHROME_PATH,
+                          user_agent = " ".join(prc.USER_AGENT),
+                          profiles_path = prc.DAEMON_PROFILES_PATH,
+                          sessions_per_site = prc.POOL_SIZES,
+                          memory_limit_mb = prc.DAEMON_MEMORY_LIMIT_MB,
+                          max_leases = prc.DAEMON_MAX_LEASES)
+    try:
+        DAEMON.serve_forever()
+    except KeyboardInterrupt:
+        print("Driver daemon stopped")
@@ -15,4 +15,5 @@ class SiteScraperItem(Item):
     link = Field()
     site = Field()
     opened = Field()
+    fingerprint = Field()
     pass
@@ -6,33 +6,106 @@ Don't forget to add your pipeline to the ITEM_PIPELINES setting
 See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 """
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
 #pylint: disable=import-error
+import project_constants as prc
 from utils.data_cleaner import select_data_cleaner
+from utils.fingerprint import get_fingerprint
+from utils.sql_control import DBControl
 #pylint: enable=import-error
 
 class SiteScraperPipeline:
-    """Class for cleaning incoming data"""
+    """Class for cleaning incoming data and dropping already seen links"""
     @classmethod
     def process_item(cls, item, spider):
         """Cleaning incoming data"""
-        _ = spider
         adapter = ItemAdapter(item)
         try:
-            adapter = cls.clean_adapter(adapter)
+            adapter = cls.clean_adapter(
+                adapter, getattr(spider, 'reference_date', None))
         except:
             None
+        seen_links = getattr(spider, 'seen_links', None)
+        if seen_links is not None and isinstance(adapter.get('link'), str):
+            if adapter['link'] in seen_links:
+                raise DropItem("Link already scraped: " + adapter['link'])
         return item
 
     @classmethod
-    def clean_adapter(cls, adapter):
-        """Cleaning incoming data from parsing bumeran"""
+    def clean_adapter(cls, adapter, today = None):
+        """Cleaning incoming data from parsing bumeran. Relative dates are
+        counted from today, unless another date is given"""
         adapter['opened'] = adapter['opened'][0]
         adapter['site'] = adapter['site'][0]
         cleaner = select_data_cleaner(adapter['site'])
         adapter['job'] = cleaner.clean_job(adapter['job'])
         adapter['company'] = cleaner.clean_company(adapter['company'])
         adapter['location'] = cleaner.clean_location(adapter['location'])
-        adapter['date'] = cleaner.clean_date(adapter['date'])
+        adapter['date'] = cleaner.clean_date(adapter['date'], today = today)
         adapter['link'] = cleaner.clean_link(adapter['link'])
+        adapter['fingerprint'] = get_fingerprint(adapter['job'],
+                                                 adapter['company'],
+                                                 adapter['location'])
         return adapter
-    
\ No newline at end of file
+
+class SQLiteStorePipeline:
+    """Class for storing cleaned items directly in the Data table, in
+    batches of one transaction each"""
+    def __init__(self):
+        self.dbc = None
+        self.batch = []
+        self.batch_size = prc.DB_BATCH_SIZE
+        self.seen_links = None
+        self.checkpoint = None
+        self.site = None
+
+    def open_spider(self, spider):
+        """Connect to DB, creating tables and indexes if needed"""
+        #Links are only added to the seen link index, and pages recorded in
+        #the checkpoint, once their items are stored
+        self.seen_links = getattr(spider, 'seen_links', None)
+        self.checkpoint = getattr(spider, 'checkpoint', None)
+        self.site = getattr(spider, 'parameters', {}).get('site')
+        if self.checkpoint is not None:
+            self.checkpoint.hold_site(self.site)
+        self.dbc = DBControl()
+        self.dbc.connect_and_check_db(prc.DB_NAME, clear = False)
+
+    def process_item(self, item, spider):
+        """Add the item to the batch, and store the batch if it is full"""
+        _ = spider
+        adapter = ItemAdapter(item)
+        #Items that couldn't be cleaned are not stored
+        if isinstance(adapter.get('link'), str):
+            row = {column: adapter.get(column)
+                   for column in DBControl.DATA_COLUMNS}
+            row['date'] = None if row['date'] is None else str(row['date'])
+            row['opened'] = int(bool(row['opened']))
+            self.batch.append([row[column]
+                               for column in DBControl.DATA_COLUMNS])
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self):
+        """Store the batch of items in DB, add their links to the seen link
+        index and record their pages in the checkpoint. Pages are recorded
+        after their items were processed, so they are stored by now"""
+        if self.batch:
+            self.dbc.upsert_data_rows(self.batch)
+            if self.seen_links is not None:
+                link_index = DBControl.DATA_COLUMNS.index('link')
+                for row in self.batch:
+                    self.seen_links.add(row[link_index])
+            self.batch = []
+        if self.checkpoint is not None:
+            self.checkpoint.commit_site(self.site)
+
+    def close_spider(self, spider):
+        """Store the remaining items, save the links stored in this run
+        and close the DB connection"""
+        _ = spider
+        self.flush()
+        if self.seen_links is not None:
+            self.seen_links.save()
+        self.dbc.connection.close()
@@ -64,6 +64,7 @@ ROBOTSTXT_OBEY = True
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     'site_scraper.pipelines.SiteScraperPipeline': 300,
+    'site_scraper.pipelines.SQLiteStorePipeline': 400,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
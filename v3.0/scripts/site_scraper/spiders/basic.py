@@ -1,13 +1,21 @@
 """
 Creates a crawler that uses selenium to get http responses, and process
-them with scrapy
+them with scrapy. Sites that allow it can be fetched with plain http
+requests through the scrapy downloader instead.
 """
 import scrapy
-from scrapy.loader import ItemLoader
-from scrapy.selector import Selector
 #pylint: disable=import-error
+import project_constants as prc
 from site_scraper.items import SiteScraperItem
-from utils.web_control import select_website_control
+from utils.checkpoint import CrawlCheckpoint
+from utils.data_cleaner import select_data_cleaner
+from utils.link_index import SeenLinkIndex
+from utils.metrics import CrawlMetrics
+from utils.page_archive import PageArchive
+from utils.query_planner import SearchStats
+from utils.xpath_cache import XPathCache
+from utils.web_control import (WebsiteControlPool, extract_cards,
+                               select_website_control)
 #pylint: enable=import-error
 
 class BasicSpider(scrapy.Spider):
@@ -18,40 +26,170 @@ class BasicSpider(scrapy.Spider):
     def __init__(self, *args, **kwargs):
         """Initialize the scraper and extra arguments"""
         super().__init__(*args, **kwargs)
-        self.ctl = None
+        self.pool = None
         self.parameters = self.parameters
+        #Links scraped in previous runs, shared with controls and pipeline
+        self.seen_links = self.get_shared(
+            'seen_links', lambda: SeenLinkIndex.load(prc.SEEN_INDEX_NAME))
+        #Card xPaths discovered in previous keywords and runs
+        self.xpath_cache = self.get_shared(
+            'xpath_cache', lambda: XPathCache.load(prc.XPATH_CACHE_NAME,
+                                                   prc.XPATH_CACHE_TTL_HOURS))
+        #Raw pages are archived to be parsed again without a browser
+        self.page_archive = self.get_shared(
+            'page_archive', lambda: (PageArchive(prc.ARCHIVE_PATH)
+                                     if prc.ARCHIVE_PAGES else None))
+        #Progress of the searches, to resume an interrupted crawl
+        self.checkpoint = self.get_shared(
+            'checkpoint', lambda: CrawlCheckpoint.load(prc.CHECKPOINT_NAME))
+        #Timing spans, shared by the spiders of every site when given
+        self.metrics = self.get_shared(
+            'metrics', lambda: CrawlMetrics(prc.METRICS_SPANS_NAME,
+                                            prc.METRICS_PROMETHEUS_NAME))
+        #Links found by each keyword, for the query planner of next crawls
+        self.search_stats = self.get_shared('search_stats', SearchStats)
+        #Date used to clean relative dates (today if None). Set on replays
+        self.reference_date = None
+        #Control used to build URLs and xPaths in http fetch mode
+        self.ctl = select_website_control(self.parameters)
+        if self.ctl:
+            self.allowed_domains = [self.ctl.domain]
+
+    @classmethod
+    def create_offline(cls, site):
+        """Create a spider that only parses pages of a site (replays and
+        benchmarks): seen links, xPath cache, checkpoint and metrics are
+        kept in memory, and pages aren't archived"""
+        return cls(parameters={'site': site, 'keywords': [],
+                               'date_lim': prc.DATE_LIMIT, 'options': {},
+                               'seen_links': SeenLinkIndex(),
+                               'xpath_cache': XPathCache(),
+                               'page_archive': None,
+                               'checkpoint': CrawlCheckpoint(),
+                               'metrics': CrawlMetrics()})
+
+    def get_shared(self, key, create):
+        """Get an object shared through the parameters. It is only created
+        (reading or writing its files) if it wasn't given, so in-memory
+        ones can be passed to run without side effects"""
+        if key not in self.parameters:
+            self.parameters[key] = create()
+        return self.parameters[key]
+
+    def use_http_fetch(self):
+        """Check if the site is fetched with plain http requests"""
+        return (self.parameters.get('fetch_mode') == 'http'
+                and self.ctl.http_fetch)
 
     def start_requests(self):
-        """Makes a ficticious request to callback the parse method"""
-        url = "https://es.wikipedia.org/wiki/Wikipedia:Portada"
-        yield scrapy.Request(url=url, callback=self.parse)
+        """Makes a request for the first page of every keyword in http fetch
+        mode. Otherwise, makes a ficticious request to callback the parse
+        method"""
+        if self.use_http_fetch():
+            site = self.parameters.get('site')
+            date_lim = self.parameters.get('date_lim')
+            for keyword in self.parameters.get('keywords'):
+                resume = self.checkpoint.get_resume(site, keyword, date_lim)
+                if resume is None:
+                    yield self.get_page_request(keyword, 1)
+                elif not resume['done']:
+                    print(site + ": Resuming after page ", resume['page'],
+                          keyword)
+                    yield self.get_page_request(keyword, resume['page'] + 1)
+        else:
+            url = "https://es.wikipedia.org/wiki/Wikipedia:Portada"
+            yield scrapy.Request(url=url, callback=self.parse,
+                                 dont_filter=True)
 
-    def parse(self, response, **kwargs):
-        """Parse each request defined by self.parameters"""
-        self.ctl = select_website_control(self.parameters)
-        generator_1 = self.ctl.multi_scrape_webpage(
+    async def start(self):
+        """Start requests for Scrapy 2.13+, which calls this instead of
+        start_requests"""
+        for request in self.start_requests():
+            yield request
+
+    async def parse(self, response, **kwargs):
+        """Parse each request defined by self.parameters. Selenium searches
+        run in the threads of the pool, so the reactor (and the spiders of
+        other sites) keep running while they load"""
+        self.pool = WebsiteControlPool(self.parameters)
+        generator_1 = self.pool.multi_scrape_webpage(
                                             self.parameters.get('keywords'),
                                             self.parameters.get('date_lim'),
                                             self.process_page)
-        for generator_2 in generator_1:
+        async for generator_2 in generator_1:
             for callback_generator in generator_2:
                 for item in callback_generator:
                     yield item
 
-    def process_page(self, text_output):
+    def closed(self, reason):
+        """Cancel the searches that are still pending or running when the
+        spider is closed (e.g. Ctrl+C), and export the timing spans"""
+        if self.pool:
+            self.pool.cancel()
+        self.metrics.save()
+
+    def get_page_request(self, keyword, page):
+        """Request for a page of results of a keyword (http fetch mode)"""
+        url = self.ctl.get_page_url(keyword, self.parameters.get('date_lim'),
+                                    page)
+        return scrapy.Request(url=url, callback=self.parse_page,
+                              cb_kwargs={'keyword': keyword, 'page': page})
+
+    def parse_page(self, response, keyword, page):
+        """Parse a page of results fetched without Selenium, and request
+        the next one if it exists (http fetch mode)"""
+        site = self.parameters.get('site')
+        self.metrics.observe('download', site, keyword,
+                             response.meta.get('download_latency', 0))
+        self.metrics.increment('pages', site, keyword)
+        self.ctl.update_xpaths(response.text)
+        if self.page_archive:
+            self.page_archive.save_page(self.parameters.get('site'), keyword,
+                                        page, response.text, self.ctl.x_paths)
+        for item in self.process_page(response.text, self.ctl.x_paths,
+                                      keyword, page):
+            yield item
+        date_lim = self.parameters.get('date_lim')
+        self.checkpoint.save_page(site, keyword, date_lim, page, response.url)
+        if (page < self.ctl.get_max_pages(keyword)
+                and self.ctl.has_next_page(response.text)
+                and not self.ctl.is_last_useful_page(response.text, date_lim)):
+            yield self.get_page_request(keyword, page + 1)
+        else:
+            self.checkpoint.finish_search(site, keyword, date_lim)
+
+    def process_page(self, text_output, x_paths, keyword=None, page=None):
         """Auxiliary generator that processes an http response and
-        gets all the required data from the page"""
-        sel = Selector(text=text_output)
-        x_paths = self.ctl.x_paths
-        selectors = sel.xpath(x_paths['cards'])
-        for selector in selectors:
-            item = ItemLoader(item=SiteScraperItem(), selector=None)
-            item.add_value('job', selector.xpath(x_paths['job']).extract())
-            item.add_value('company', selector.xpath(x_paths['company']).extract())
-            item.add_value('location', selector.xpath(x_paths['location']).extract())
-            item.add_value('date', selector.xpath(x_paths['date']).extract())
-            item.add_value('link', selector.xpath(x_paths['link']).extract())
-            item.add_value('site', self.parameters.get('site'))
-            item.add_value('opened', False)
-            yield item.load_item()
-    
\ No newline at end of file
+        gets all the required data from the page, using the xPaths of
+        the control that loaded it. All the cards are extracted in one pass
+        with precompiled xPaths. Links of keyword searches are added to the
+        search stats"""
+        site = self.parameters.get('site')
+        with self.metrics.span('process_page', site, keyword):
+            cards = extract_cards(text_output, x_paths)
+        if keyword is not None:
+            self.add_search_stats(keyword, page, cards)
+        #Discover xPaths again in the next search if these don't work for
+        #most cards (a few can be promos or navigation)
+        num_empty = sum(not (card['job'] and card['link']) for card in cards)
+        if num_empty*2 > len(cards):
+            self.xpath_cache.invalidate(site)
+        for card in cards:
+            #Same values as an ItemLoader: lists, and no empty fields
+            item = SiteScraperItem(site=[site], opened=[False])
+            for key, values in card.items():
+                if values:
+                    item[key] = values
+            yield item
+
+    def add_search_stats(self, keyword, page, cards):
+        """Record the cleaned links of a page of a keyword search"""
+        cleaner = select_data_cleaner(self.parameters.get('site'))
+        links = list()
+        for card in cards:
+            try:
+                links.append(cleaner.clean_link(card['link']))
+            except (IndexError, KeyError, ValueError, TypeError):
+                continue
+        self.search_stats.add_page(self.parameters.get('site'), keyword, page,
+                                   links, self.seen_links)
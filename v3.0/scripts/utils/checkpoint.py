@@ -0,0 +1,126 @@
+"""
+Journal of the crawl progress, so a restarted run resumes where the last
+one stopped
+"""
+import os
+import json
+import threading
+from datetime import datetime
+
+class CrawlCheckpoint:
+    """
+    JSON lines journal with the last processed page (and its URL) of every
+    (site, keyword, date_lim) search, and whether the search is done. Only
+    the entries of the current day are loaded, since date limits are
+    relative to it. The journal is cleared when a crawl completes.
+    Entries of held sites are only written when committed, once the items
+    of their pages are stored.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = dict()
+        self.lock = threading.Lock()
+        #Entries waiting for a commit, by held site
+        self.pending = dict()
+
+    @classmethod
+    def get_key(cls, site, keyword, date_lim):
+        """Key of a search in the entries"""
+        return (site, keyword, date_lim)
+
+    #####################################
+    ##Load, write and clear journal
+    @classmethod
+    def load(cls, path):
+        """Load the journal of today from disk. Later lines of a search
+        replace earlier ones"""
+        checkpoint = cls(path)
+        today = str(datetime.now().date())
+        if path and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        #Last line can be cut if the process was killed
+                        continue
+                    if entry['day'] == today:
+                        checkpoint.entries[cls.get_key(
+                            entry['site'], entry['keyword'],
+                            entry['date_lim'])] = entry
+        return checkpoint
+
+    def write_entry(self, entry):
+        """Store an entry and append it to the journal (when committed,
+        if its site is held)"""
+        with self.lock:
+            self.entries[self.get_key(entry['site'], entry['keyword'],
+                                      entry['date_lim'])] = entry
+            if entry['site'] in self.pending:
+                self.pending[entry['site']].append(entry)
+            else:
+                self.append_entries([entry])
+
+    def append_entries(self, entries):
+        """Append entries to the journal"""
+        if self.path and entries:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(entry) + '\n' for entry in entries)
+
+    def hold_site(self, site):
+        """Keep the entries of a site in memory until they are committed"""
+        with self.lock:
+            self.pending.setdefault(site, list())
+
+    def commit_site(self, site):
+        """Write the entries of a held site recorded since the last commit"""
+        with self.lock:
+            entries = self.pending.get(site, [])
+            if site in self.pending:
+                self.pending[site] = list()
+            self.append_entries(entries)
+
+    def clear(self):
+        """Forget every entry and delete the journal"""
+        with self.lock:
+            self.entries = dict()
+            if self.path and os.path.isfile(self.path):
+                os.remove(self.path)
+
+    #####################################
+    ##Record and check progress
+    def save_page(self, site, keyword, date_lim, page, url):
+        """Record that a page was processed"""
+        self.write_entry({'site': site, 'keyword': keyword,
+                          'date_lim': date_lim, 'page': page, 'url': url,
+                          'done': False, 'day': str(datetime.now().date())})
+
+    def finish_search(self, site, keyword, date_lim):
+        """Record that every page of a search was processed"""
+        entry = dict(self.get_resume(site, keyword, date_lim) or
+                     {'site': site, 'keyword': keyword, 'date_lim': date_lim,
+                      'page': 0, 'url': None})
+        entry.update(done=True, day=str(datetime.now().date()))
+        self.write_entry(entry)
+
+    def get_resume(self, site, keyword, date_lim):
+        """Get the last entry of a search (None if it wasn't started)"""
+        with self.lock:
+            return self.entries.get(self.get_key(site, keyword, date_lim))
+
+    def is_done(self, site, keyword, date_lim):
+        """Check if a search was completed"""
+        entry = self.get_resume(site, keyword, date_lim)
+        return entry is not None and entry['done']
+
+    def is_complete(self, parameter_array):
+        """Check if every search of a crawl was completed"""
+        return all(self.is_done(parameters['site'], keyword,
+                                parameters['date_lim'])
+                   for parameters in parameter_array
+                   for keyword in parameters['keywords'])
+
+    def __len__(self):
+        return len(self.entries)
@@ -2,25 +2,48 @@
 Libraries for cleaning scraped data
 """
 import re
-from datetime import timedelta, datetime
+from datetime import datetime
+import pandas as pd
 #pylint: disable=import-error
 import project_constants as prc
+from utils.date_parser import parse_date
+from utils.fingerprint import get_fingerprint
 #pylint: enable=import-error
 
+#Precompiled patterns for cleaning job names, applied in order
+JOB_PATTERNS = [(re.compile(r'\(a\)'), ''),
+                (re.compile(r'[^0-9a-zA-Z \u00C0-\u00FF,]+'), ''),
+                (re.compile(r' +'), ' ')]
+RAW_COLUMNS = ['job', 'company', 'location', 'date', 'link', 'site']
+CLEAN_COLUMNS = ['job', 'company', 'location', 'date', 'site', 'opened',
+                 'link', 'fingerprint']
+
+def get_item(series, index):
+    """Get an element of the lists of a column (NaN where missing) as an
+    object column, so .str also works when no row has it"""
+    return series.astype(object).str[index].astype(object)
+
 def select_data_cleaner(site):
-    """Return a control object based on the site to scrape"""
-    allowed_sites = prc.ALLOWED_SITES
-    cleaner = None
-    if site == allowed_sites[0]:
-        cleaner = BumeranCleaner()
-    elif site == allowed_sites[1]:
-        cleaner = ComputrabajoCleaner()
-    elif site == allowed_sites[2]:
-        cleaner = IndeedCleaner()
-    return cleaner
+    """Return a control object based on the site to scrape. Cleaners have
+    no state, so the same object is returned for a site"""
+    if site not in CLEANERS:
+        allowed_sites = prc.ALLOWED_SITES
+        cleaner = None
+        if site == allowed_sites[0]:
+            cleaner = BumeranCleaner()
+        elif site == allowed_sites[1]:
+            cleaner = ComputrabajoCleaner()
+        elif site == allowed_sites[2]:
+            cleaner = IndeedCleaner()
+        CLEANERS[site] = cleaner
+    return CLEANERS[site]
 
 class DataCleaner:
-    """Class with methods that will be overriden in cleaners"""
+    """Class with methods that will be overriden in cleaners. The
+    clean_<field> methods clean the list extracted for one item, and the
+    clean_<field>_column ones a pandas series of those lists"""
+    site = None
+
     @classmethod
     def clean_job(cls, column_value):
         """Method for cleaning job name"""
@@ -37,29 +60,97 @@ class DataCleaner:
         return column_value
 
     @classmethod
-    def clean_date(cls, column_value):
-        """Method for cleaning date info"""
-        return column_value
+    def clean_date(cls, column_value, today = None):
+        """Method for cleaning date info, with the date rules of the site.
+        Relative dates are counted from today, unless another date is given"""
+        return parse_date(cls.site, column_value[0], today or datetime.now().date())
 
     @classmethod
     def clean_link(cls, column_value):
         """Method for cleaning link info"""
         return column_value
 
+    #####################################
+    ##Batch cleaning
+    @classmethod
+    def clean_batch(cls, dataframe, today = None):
+        """Clean a batch of raw items (a dataframe with the lists extracted
+        for each field, like the ones from process_page) at once. "Today"
+        is computed once for the batch. Returns a dataframe with the
+        columns of the Data table, without the rows that can't be used"""
+        today = today or datetime.now().date()
+        if dataframe.empty:
+            return pd.DataFrame(columns = CLEAN_COLUMNS, dtype = object)
+        #Object columns, so .str works on the ones that are missing or NaN
+        dataframe = dataframe.reindex(columns = RAW_COLUMNS).astype(object)
+        cleaned = pd.DataFrame(index = dataframe.index)
+        cleaned['job'] = cls.clean_job_column(dataframe['job'])
+        cleaned['company'] = cls.clean_company_column(dataframe['company'])
+        cleaned['location'] = cls.clean_location_column(dataframe['location'])
+        cleaned['date'] = cls.clean_date_column(dataframe['date'], today)
+        cleaned['site'] = get_item(dataframe['site'], 0)
+        cleaned['opened'] = 0
+        cleaned['link'] = cls.clean_link_column(dataframe['link'])
+        cleaned = cleaned.dropna(subset = ['job', 'link'])
+        cleaned = cleaned.astype(object).where(cleaned.notna(), None)
+        cleaned['fingerprint'] = [
+            get_fingerprint(job, company, location)
+            for job, company, location in zip(cleaned['job'],
+                                              cleaned['company'],
+                                              cleaned['location'])]
+        return cleaned
+
+    @classmethod
+    def clean_job_column(cls, series):
+        """Method for cleaning a column of job names"""
+        return get_item(series, 0)
+
+    @classmethod
+    def clean_company_column(cls, series):
+        """Method for cleaning a column of company names"""
+        return get_item(series, 0)
+
+    @classmethod
+    def clean_location_column(cls, series):
+        """Method for cleaning a column of location data"""
+        return get_item(series, 0)
+
+    @classmethod
+    def clean_date_column(cls, series, today):
+        """Method for cleaning a column of date info. Each distinct date
+        string is only cleaned once"""
+        raw_dates = get_item(series, 0)
+        clean_dates = dict()
+        for raw_date in raw_dates.dropna().unique():
+            clean_date = parse_date(cls.site, raw_date, today)
+            clean_dates[raw_date] = None if clean_date is None else str(clean_date)
+        return raw_dates.map(clean_dates)
+
+    @classmethod
+    def clean_link_column(cls, series):
+        """Method for cleaning a column of link info"""
+        return get_item(series, 0)
+
+    @classmethod
+    def clean_job_string(cls, series):
+        """Auxiliary method for cleaning a column of job strings with the
+        precompiled patterns"""
+        series = series.str.lower().str.strip()
+        for pattern, replacement in JOB_PATTERNS:
+            series = series.str.replace(pattern, replacement, regex = True)
+        return series
+
 class BumeranCleaner(DataCleaner):
     """Class for bumeran data cleaning"""
-    monthDict = {'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
-                'mayo':5 , 'junio':6, 'julio':7, 'agosto':8,
-                'setiembre':9, 'septiembre':9, 'octubre':10,
-                'noviembre':11, 'diciembre':12}
+    site = 'Bumeran'
     base_URL = "https://www.bumeran.com.pe"
 
     @classmethod
     def clean_job(cls, column_value):
         """Method for cleaning job name"""
-        tmpstring = re.sub(r'\(a\)', '', column_value[0].lower().strip())
-        tmpstring = re.sub(r'[^0-9a-zA-Z \u00C0-\u00FF,]+', '', tmpstring)
-        tmpstring = re.sub(r' +', ' ', tmpstring)
+        tmpstring = column_value[0].lower().strip()
+        for pattern, replacement in JOB_PATTERNS:
+            tmpstring = pattern.sub(replacement, tmpstring)
         return tmpstring
 
     @classmethod
@@ -74,61 +165,42 @@ class BumeranCleaner(DataCleaner):
             return None
         return column_value[0].lower()
 
-    @classmethod
-    def get_lag_days(cls, split_string):
-        """Auxiliary method for getting lag days"""
-        len_string = len(split_string)
-        lag_days = -1
-        if len_string == 2:
-            lag_days = (0 if split_string[1] == 'Hoy' else 1)
-        elif len_string == 4:
-            lag_days = int(split_string[2])
-        return lag_days
-
-    @classmethod
-    def get_day_month_year(cls, split_string):
-        """Auxiliary method for getting the date of a given format"""
-        today = datetime.now().date()
-        year = today.year
-        month = cls.monthDict[split_string[4]]
-        day = int(split_string[2])
-        tmp = datetime(year, month, day)
-        if today < tmp.date():
-            tmp = datetime(tmp.year -1 , tmp.month, tmp.day)
-        return tmp.date()
-
-    @classmethod
-    def clean_date(cls, column_value):
-        """Method for cleaning date info"""
-        today = datetime.now().date()
-        tmp = re.split(' ', column_value[0])
-        lag_days = cls.get_lag_days(tmp)
-        return_date = None
-        if lag_days >= 0:
-            return_date = today - timedelta(days = lag_days)
-        elif len(tmp) == 5:
-            return_date = cls.get_day_month_year(tmp)
-        return return_date
-
     @classmethod
     def clean_link(cls, column_value):
         """Method for cleaning link info"""
         return cls.base_URL + column_value[0]
 
+    @classmethod
+    def clean_job_column(cls, series):
+        """Method for cleaning a column of job names"""
+        return cls.clean_job_string(get_item(series, 0))
+
+    @classmethod
+    def clean_company_column(cls, series):
+        """Method for cleaning a column of company names"""
+        return get_item(series, 0).str.lower().str.strip()
+
+    @classmethod
+    def clean_location_column(cls, series):
+        """Method for cleaning a column of location data"""
+        return get_item(series, 0).str.lower()
+
+    @classmethod
+    def clean_link_column(cls, series):
+        """Method for cleaning a column of link info"""
+        return cls.base_URL + get_item(series, 0)
+
 class ComputrabajoCleaner(DataCleaner):
     """Class for computrabajo data cleaning"""
-    monthDict = {'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
-                'mayo':5 , 'junio':6, 'julio':7, 'agosto':8,
-                'setiembre':9, 'septiembre':9, 'octubre':10,
-                'noviembre':11, 'diciembre':12}
+    site = 'Computrabajo'
     base_URL = "https://www.computrabajo.com.pe"
 
     @classmethod
     def clean_job(cls, column_value):
         """Method for cleaning job name"""
-        tmpstring = re.sub(r'\(a\)', '', column_value[0].lower().strip())
-        tmpstring = re.sub(r'[^0-9a-zA-Z \u00C0-\u00FF,]+', '', tmpstring)
-        tmpstring = re.sub(r' +', ' ', tmpstring)
+        tmpstring = column_value[0].lower().strip()
+        for pattern, replacement in JOB_PATTERNS:
+            tmpstring = pattern.sub(replacement, tmpstring)
         return tmpstring
 
     @classmethod
@@ -148,60 +220,38 @@ class ComputrabajoCleaner(DataCleaner):
             location = column_value[-1].lower().strip()
         return location
 
-    @classmethod
-    def get_lag_days(cls, split_string):
-        """Auxiliary method for getting lag days"""
-        lag_days = -1
-        if split_string[0] == "Ayer":
-            lag_days = 1
-        elif split_string[0] == "Ahora":
-            lag_days = 0
-        elif split_string[0] == "Hace":
-            if split_string[2] == "día" or split_string[2] == "días":
-                lag_days = int(split_string[1])
-            else:
-                lag_days = 0
-        return lag_days
-
-    @classmethod
-    def get_day_month_year(cls, split_string):
-        """Auxiliary method for getting the date of a given format"""
-        today = datetime.now().date()
-        year = today.year
-        month = cls.monthDict[split_string[2]]
-        day = int(split_string[0])
-        tmp = datetime(year, month, day)
-        if today < tmp.date():
-            tmp = datetime(tmp.year -1 , tmp.month, tmp.day)
-        return tmp.date()
-
-    @classmethod
-    def clean_date(cls, column_value):
-        """Method for cleaning date info"""
-        today = datetime.now().date()
-        tmp = re.split(' ', column_value[0])
-        lag_days = cls.get_lag_days(tmp)
-        return_date = None
-        if lag_days >= 0:
-            return_date = today - timedelta(days = lag_days)
-        elif len(tmp) == 3:
-            return_date = cls.get_day_month_year(tmp)
-        else:
-            #More than 30 days
-            return_date = today - timedelta(days = 30)
-        return return_date
-
     @classmethod
     def clean_link(cls, column_value):
         """Method for cleaning link info"""
         return cls.base_URL + column_value[0]
 
+    @classmethod
+    def clean_job_column(cls, series):
+        """Method for cleaning a column of job names"""
+        return cls.clean_job_string(get_item(series, 0))
+
+    @classmethod
+    def clean_company_column(cls, series):
+        """Method for cleaning a column of company names"""
+        company = get_item(series, 1).str.lower().str.strip()
+        return company.where(series.isna() | company.notna(), "confidencial")
+
+    @classmethod
+    def clean_location_column(cls, series):
+        """Method for cleaning a column of location data"""
+        location = get_item(series, -1).where(
+            series.str.len() != 1,
+            get_item(series, 0).str.split('\n').str[-1])
+        return location.str.lower().str.strip()
+
+    @classmethod
+    def clean_link_column(cls, series):
+        """Method for cleaning a column of link info"""
+        return cls.base_URL + get_item(series, 0)
+
 class IndeedCleaner(DataCleaner):
     """Class for indeed data cleaning"""
-    monthDict = {'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
-                'mayo':5 , 'junio':6, 'julio':7, 'agosto':8,
-                'setiembre':9, 'septiembre':9, 'octubre':10,
-                'noviembre':11, 'diciembre':12}
+    site = 'Indeed'
     base_URL = "https://pe.indeed.com"
 
     @classmethod
@@ -220,30 +270,28 @@ class IndeedCleaner(DataCleaner):
         return column_value[0].lower().strip()
 
     @classmethod
-    def get_lag_days(cls, split_string):
-        """Auxiliary method for getting lag days"""
-        lag_days = None
-        len_string = len(split_string)
-        if len_string < 3:
-            lag_days = 0
-        elif split_string[1].isnumeric():
-            lag_days = int(split_string[1])
-        else:
-            #More than 30 days.
-            lag_days = 30
-        return lag_days
+    def clean_link(cls, column_value):
+        """Method for cleaning link info"""
+        return cls.base_URL + column_value[0]
 
     @classmethod
-    def clean_date(cls, column_value):
-        """Method for cleaning date info"""
-        today = datetime.now().date()
-        tmp = re.split(' ', column_value[0])
-        lag_days = cls.get_lag_days(tmp)
-        return_date = today - timedelta(days = lag_days)
-        return return_date
+    def clean_job_column(cls, series):
+        """Method for cleaning a column of job names"""
+        return get_item(series, 0).str.lower().str.strip()
 
     @classmethod
-    def clean_link(cls, column_value):
-        """Method for cleaning link info"""
-        return cls.base_URL + column_value[0]
-    
\ No newline at end of file
+    def clean_company_column(cls, series):
+        """Method for cleaning a column of company names"""
+        return get_item(series, 0).str.lower().str.strip()
+
+    @classmethod
+    def clean_location_column(cls, series):
+        """Method for cleaning a column of location data"""
+        return get_item(series, 0).str.lower().str.strip()
+
+    @classmethod
+    def clean_link_column(cls, series):
+        """Method for cleaning a column of link info"""
+        return cls.base_URL + get_item(series, 0)
+
+CLEANERS = dict()
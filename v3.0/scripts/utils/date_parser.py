@@ -0,0 +1,65 @@
+"""
+Table driven parser for the relative and absolute dates shown by the sites
+("Publicado hace 2 días", "Hace 3 horas", "12 de octubre", ...)
+"""
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+
+MONTHS = {'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
+          'mayo': 5, 'junio': 6, 'julio': 7, 'agosto': 8,
+          'setiembre': 9, 'septiembre': 9, 'octubre': 10,
+          'noviembre': 11, 'diciembre': 12}
+#Rules by site, tried in order: (pattern, lag days). Patterns without a
+#fixed lag get it from the 'lag' group, or the date from 'day' and 'month'
+DATE_RULES = {
+    'Bumeran': [(re.compile(r'^[^ ]+ Hoy$'), 0),
+                (re.compile(r'^[^ ]+ [^ ]+$'), 1),
+                (re.compile(r'^[^ ]+ [^ ]+ (?P<lag>\d+) [^ ]+$'), None),
+                (re.compile(r'^[^ ]+ [^ ]+ (?P<day>\d+) [^ ]+ (?P<month>[^ ]+)$'),
+                 None)],
+    'Computrabajo': [(re.compile(r'^Ayer( |$)'), 1),
+                     (re.compile(r'^Ahora( |$)'), 0),
+                     (re.compile(r'^Hace (?P<lag>\d+) días?( |$)'), None),
+                     (re.compile(r'^Hace( |$)'), 0),
+                     (re.compile(r'^(?P<day>\d+) [^ ]+ (?P<month>[^ ]+)$'), None)],
+    'Indeed': [(re.compile(r'^[^ ]*( [^ ]*)?$'), 0),
+               (re.compile(r'^[^ ]* (?P<lag>\d+)( |$)'), None)]}
+#Lag days when no rule matches (None: the date is unknown)
+DEFAULT_LAGS = {'Bumeran': None, 'Computrabajo': 30, 'Indeed': 30}
+
+def get_day_month_date(day, month, reference_date):
+    """Get the date of a day and month name, in the last year up to the
+    reference date"""
+    month = MONTHS.get(month.lower())
+    if month is None:
+        return None
+    try:
+        tmp = date(reference_date.year, month, int(day))
+        if reference_date < tmp:
+            tmp = date(tmp.year - 1, tmp.month, tmp.day)
+    except ValueError:
+        return None
+    return tmp
+
+@lru_cache(maxsize = 4096)
+def parse_date(site, raw_date, reference_date):
+    """Get the date of a date string shown in a site, with relative dates
+    counted from the reference date. Returns None if it can't be known.
+    The distinct strings of a run are few, so results are cached"""
+    if raw_date is None:
+        return None
+    raw_date = raw_date.strip()
+    for pattern, lag_days in DATE_RULES.get(site, []):
+        match = pattern.match(raw_date)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        if lag_days is None and 'day' in groups:
+            return get_day_month_date(groups['day'], groups['month'],
+                                      reference_date)
+        if lag_days is None:
+            lag_days = int(groups['lag'])
+        return reference_date - timedelta(days = lag_days)
+    lag_days = DEFAULT_LAGS.get(site)
+    return None if lag_days is None else reference_date - timedelta(days = lag_days)
@@ -0,0 +1,338 @@
+"""
+Local daemon that keeps warm headless Chrome sessions for each site, so the
+crawler attaches to a running browser instead of starting a new one
+"""
+import os
+import time
+import shutil
+import socket
+import threading
+import subprocess
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def write_authkey(path):
+    """Generate a new authkey and store it in a file only the user can
+    read"""
+    authkey = os.urandom(32)
+    if os.path.exists(path):
+        os.remove(path)
+    file_descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                              0o600)
+    with os.fdopen(file_descriptor, 'wb') as file:
+        file.write(authkey)
+    return authkey
+
+def read_authkey(path):
+    """Read the authkey of a running daemon (None if it isn't running)"""
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except OSError:
+        return None
+
+def get_process_tree_pids(pid):
+    """Get the pid of a process and its descendants from /proc (psutil
+    isn't installed)"""
+    children = dict()
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(name), 'r') as file:
+                #The process name can contain spaces, the ppid follows it
+                parent = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+    pids = [pid]
+    for current in pids:
+        pids += children.get(current, [])
+    return pids
+
+def can_measure_memory():
+    """Check if the memory of browsers can be measured (psutil is
+    installed, or there is a /proc file system)"""
+    return psutil is not None or os.path.isdir('/proc')
+
+def get_process_tree_memory_mb(pid):
+    """Resident memory (MB) of a process and its descendants (the renderer,
+    GPU and utility processes of a browser). 0 if it can't be measured"""
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return 0
+        memory = 0
+        for child in processes:
+            try:
+                memory += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return memory/2**20
+    if not os.path.isdir('/proc'):
+        return 0
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    memory = 0
+    for child in get_process_tree_pids(pid):
+        try:
+            with open('/proc/{}/statm'.format(child), 'r') as file:
+                memory += int(file.read().split()[1])*page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return memory/2**20
+
+class BrowserSession:
+    """Headless Chrome with a remote debugging port and its own profile, so
+    cookies (and dismissed banners) survive between leases"""
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, session_id, site, port, profile_path):
+        self.session_id = session_id
+        self.site = site
+        self.port = port
+        self.profile_path = profile_path
+        self.process = None
+        self.ready = False
+        self.recycling = False
+        self.extras_attended = False
+        self.leased = False
+        self.num_leases = 0
+
+    def start(self, chrome_path, user_agent):
+        """Launch the browser"""
+        self.process = subprocess.Popen(
+            [chrome_path, '--headless', '--disable-gpu',
+             '--remote-debugging-port={}'.format(self.port),
+             '--user-data-dir={}'.format(self.profile_path),
+             '--window-size=1920,1080', '--disable-infobars',
+             '--user-agent={}'.format(user_agent), 'about:blank'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def wait_until_ready(self, timeout=15):
+        """Wait until the debugging port accepts connections, so crawlers
+        can attach. Returns if it is ready"""
+        deadline = time.monotonic() + timeout
+        while self.is_alive() and time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port),
+                                         timeout=0.5).close()
+            except OSError:
+                time.sleep(0.1)
+            else:
+                self.ready = True
+                break
+        return self.ready
+
+    def get_memory_mb(self):
+        """Resident memory of the browser and its child processes"""
+        if not self.is_alive():
+            return 0
+        return get_process_tree_memory_mb(self.process.pid)
+
+    def stop(self):
+        """Close the browser"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def is_alive(self):
+        """Check if the browser is still running"""
+        return self.process is not None and self.process.poll() is None
+
+    def get_lease(self):
+        """Data the crawler needs to attach to the session"""
+        return {'session_id': self.session_id, 'site': self.site,
+                'debugger_address': "127.0.0.1:{}".format(self.port),
+                'extras_attended': self.extras_attended}
+
+class DriverDaemon:
+    """
+    Keeps sessions_per_site warm browser sessions for each site and leases
+    them to crawlers through a multiprocessing connection, authenticated
+    with a key generated at start (stored in authkey_path, readable only by
+    the user). Sessions are recycled (restarted with a clean state) when
+    their browser uses more memory than memory_limit_mb, after max_leases
+    leases, or if the crawler reports a crash.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, address, authkey_path, **kwargs):
+        self.address = address
+        self.authkey_path = authkey_path
+        self.chrome_path = kwargs.get('chrome_path')
+        self.user_agent = kwargs.get('user_agent', '')
+        self.profiles_path = kwargs.get('profiles_path', 'driver_profiles')
+        self.sessions_per_site = kwargs.get('sessions_per_site', {})
+        self.memory_limit_mb = kwargs.get('memory_limit_mb', 1024)
+        self.max_leases = kwargs.get('max_leases', 50)
+        self.next_port = kwargs.get('first_port', 9222)
+        self.sessions = dict()
+        self.lock = threading.Lock()
+        self.listener = None
+        self.closed = False
+
+    #####################################
+    ##Start, lease, release and recycle sessions
+    def start_session(self, site, session_id=None):
+        """Launch a browser session for a site (or restart one). The lock
+        is only held to reserve its port and store it, not while the
+        browser starts"""
+        with self.lock:
+            session_id = session_id or "{}-{}".format(site, self.next_port)
+            port = self.next_port
+            self.next_port += 1
+        session = BrowserSession(session_id, site, port,
+                                 os.path.join(self.profiles_path, session_id))
+        session.start(self.chrome_path, self.user_agent)
+        if not session.wait_until_ready():
+            print(site + ": Browser session didn't open its port", session_id)
+        with self.lock:
+            if self.closed:
+                #Restarted while the daemon was shutting down
+                session.stop()
+            else:
+                self.sessions[session_id] = session
+        return session
+
+    def warm_up(self):
+        """Launch the sessions of every site"""
+        for site, num_sessions in self.sessions_per_site.items():
+            for _ in range(num_sessions):
+                self.start_session(site)
+
+    def lease(self, site):
+        """Lease an idle and ready session of the site, or None if all are
+        in use or restarting"""
+        with self.lock:
+            for session in list(self.sessions.values()):
+                if (session.site != site or session.leased
+                        or session.recycling):
+                    continue
+                if not session.is_alive():
+                    self.schedule_recycle(session)
+                    continue
+                if not session.ready:
+                    continue
+                session.leased = True
+                session.num_leases += 1
+                return session.get_lease()
+        return None
+
+    def release(self, session_id, extras_attended=False, crashed=False):
+        """Return a session. It is recycled if its browser grew too much or
+        crashed"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        memory_mb = session.get_memory_mb()
+        with self.lock:
+            session.leased = False
+            session.extras_attended = extras_attended
+            if (crashed or memory_mb > self.memory_limit_mb
+                    or session.num_leases >= self.max_leases
+                    or not session.is_alive()):
+                self.schedule_recycle(session)
+
+    def schedule_recycle(self, session):
+        """Restart a session in a thread, so leases and releases of other
+        sessions don't wait for the browser (called with the lock held)"""
+        session.recycling = True
+        session.ready = False
+        threading.Thread(target=self.recycle, args=(session,),
+                         daemon=True).start()
+
+    def recycle(self, session):
+        """Restart a session with a clean profile"""
+        print(session.site + ": Recycling browser session", session.session_id)
+        session.stop()
+        shutil.rmtree(session.profile_path, ignore_errors=True)
+        return self.start_session(session.site, session.session_id)
+
+    def shutdown(self):
+        """Close every session"""
+        with self.lock:
+            self.closed = True
+            for session in self.sessions.values():
+                session.stop()
+            self.sessions = dict()
+
+    #####################################
+    ##Serve requests
+    def handle_connection(self, connection):
+        """Answer a request: ('lease', site) or ('release', session_id,
+        extras_attended, crashed)"""
+        with connection:
+            try:
+                request = connection.recv()
+            except EOFError:
+                return
+            if request[0] == 'lease':
+                connection.send(self.lease(request[1]))
+            elif request[0] == 'release':
+                self.release(*request[1:])
+                connection.send(True)
+
+    def serve_forever(self):
+        """Warm up sessions and serve leases until interrupted"""
+        if not can_measure_memory():
+            print("Warning: browser memory can't be measured without psutil"
+                  " (pip install psutil). Sessions are only recycled after",
+                  self.max_leases, "leases or a crash")
+        self.warm_up()
+        self.listener = Listener(self.address,
+                                 authkey=write_authkey(self.authkey_path))
+        print("Driver daemon listening on", self.address)
+        try:
+            while True:
+                try:
+                    connection = self.listener.accept()
+                except (AuthenticationError, OSError):
+                    #Clients without the key are rejected
+                    continue
+                threading.Thread(target=self.handle_connection,
+                                 args=(connection,), daemon=True).start()
+        finally:
+            self.listener.close()
+            if os.path.exists(self.authkey_path):
+                os.remove(self.authkey_path)
+            self.shutdown()
+
+class DriverDaemonClient:
+    """Leases sessions from a running DriverDaemon, with the authkey it
+    stored. Every call returns None if the daemon isn't running, so
+    crawlers start their own browser"""
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, address, authkey_path):
+        self.address = address
+        self.authkey_path = authkey_path
+
+    def request(self, *request):
+        """Send a request to the daemon and get the answer"""
+        authkey = read_authkey(self.authkey_path)
+        if authkey is None:
+            return None
+        try:
+            with Client(self.address, authkey=authkey) as connection:
+                connection.send(request)
+                return connection.recv()
+        except (OSError, EOFError):
+            return None
+
+    def lease(self, site):
+        """Lease a warm session of the site"""
+        return self.request('lease', site)
+
+    def release(self, session_id, extras_attended=False, crashed=False):
+        """Return a leased session"""
+        return self.request('release', session_id, extras_attended, crashed)
@@ -0,0 +1,63 @@
+"""
+Fingerprints and MinHash signatures of postings, to find the same vacancy
+published in several sites (with different links)
+"""
+import re
+import struct
+import hashlib
+import unidecode
+
+COMPANY_SUFFIXES = re.compile(r'\b(s ?a ?c|s ?a ?a|s ?a|s ?r ?l|e ?i ?r ?l)\b')
+SHINGLE_SIZE = 4
+#Signatures of 32 values, in 8 bands of 4 (postings that share a band are
+#compared; it catches most pairs with a similarity above 0.6)
+NUM_BANDS = 8
+BAND_SIZE = 4
+
+def normalize_text(text):
+    """Lowercase ASCII words of a text, without punctuation"""
+    text = unidecode.unidecode((text or "").lower())
+    return " ".join(re.findall(r'[0-9a-z]+', text))
+
+def normalize_company(company):
+    """Normalized company name, without the legal form (S.A.C., S.R.L...)"""
+    company = COMPANY_SUFFIXES.sub(' ', normalize_text(company))
+    return " ".join(company.split())
+
+def get_city(location):
+    """First part of a location ("Lima, San Isidro" and "Lima" are both
+    "lima"), since every site writes them differently"""
+    return normalize_text((location or "").split(',')[0])
+
+def get_fingerprint(job, company, location):
+    """Hash of the normalized job, company and city of a posting"""
+    key = "|".join([normalize_text(job), normalize_company(company),
+                    get_city(location)])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def get_minhash(job, company):
+    """MinHash signature of the character shingles of job and company"""
+    text = normalize_text(job) + " " + normalize_company(company)
+    shingles = {text[index:index + SHINGLE_SIZE]
+                for index in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = list()
+    for shingle in shingles:
+        data = shingle.encode('utf-8')
+        hashes.append(
+            struct.unpack('<16I', hashlib.blake2b(data, digest_size=64).digest())
+            + struct.unpack('<16I', hashlib.blake2b(
+                data, digest_size=64, key=b'minhash').digest()))
+    return [min(values) for values in zip(*hashes)]
+
+def get_band_keys(signature):
+    """Keys of the LSH bands of a signature"""
+    return ["{}:{}".format(band, hashlib.blake2b(
+        struct.pack('<{}I'.format(BAND_SIZE),
+                    *signature[band*BAND_SIZE:(band + 1)*BAND_SIZE]),
+        digest_size=8).hexdigest())
+            for band in range(NUM_BANDS)]
+
+def estimate_similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of the shingles of two postings"""
+    return (sum(a == b for a, b in zip(signature_a, signature_b))
+            / len(signature_a))
@@ -0,0 +1,82 @@
+"""
+Persistent index of the links that were already scraped
+"""
+import os
+import hashlib
+import threading
+
+class SeenLinkIndex:
+    """
+    Set of hashed links stored on disk (one hex digest per line). It is
+    loaded once at spider start, checked while crawling, and the new links
+    are appended to the file when the spider closes. Links added during the
+    run are kept apart, so was_known only answers for the loaded ones.
+    """
+    DIGEST_SIZE = 8
+
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, path=None):
+        self.path = path
+        self.digests = set()
+        self.new_digests = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def hash_link(cls, link):
+        """Get the hex digest used to store a link"""
+        return hashlib.blake2b(link.encode('utf-8'),
+                               digest_size=cls.DIGEST_SIZE).hexdigest()
+
+    #####################################
+    ##Load and save index
+    @classmethod
+    def load(cls, path):
+        """Load the index from disk. Returns an empty one if the file
+        doesn't exist"""
+        index = cls(path)
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                index.digests = {line.strip() for line in file if line.strip()}
+        return index
+
+    def save(self):
+        """Append the links added since load to the file on disk"""
+        with self.lock:
+            if not self.new_digests:
+                return
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.writelines(digest + '\n' for digest in self.new_digests)
+            self.digests |= self.new_digests
+            self.new_digests = set()
+
+    def rebuild(self, links):
+        """Rewrite the index from a collection of links (e.g. the ones in the
+        Data table)"""
+        with self.lock:
+            self.digests = {self.hash_link(link) for link in links}
+            self.new_digests = set()
+            with open(self.path, 'w', encoding='utf-8') as file:
+                file.writelines(digest + '\n' for digest in self.digests)
+
+    #####################################
+    ##Check and add links
+    def __contains__(self, link):
+        digest = self.hash_link(link)
+        return digest in self.digests or digest in self.new_digests
+
+    def __len__(self):
+        return len(self.digests) + len(self.new_digests)
+
+    def was_known(self, link):
+        """Check if the link was in the index when it was loaded"""
+        return self.hash_link(link) in self.digests
+
+    def add(self, link):
+        """Add a link. Returns False if it was already in the index"""
+        digest = self.hash_link(link)
+        with self.lock:
+            if digest in self.digests or digest in self.new_digests:
+                return False
+            self.new_digests.add(digest)
+        return True
@@ -0,0 +1,121 @@
+"""
+Timing spans and counters of the crawl, exported as JSON lines and as a
+Prometheus text file
+"""
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format"""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+def format_labels(labels):
+    """Get the {name="value",...} part of a Prometheus sample"""
+    return "{" + ",".join('{}="{}"'.format(name, escape_label(value))
+                          for name, value in labels) + "}"
+
+class CrawlMetrics:
+    """
+    Collects timing spans (open_driver, load_search_results, page loads,
+    process_page, ...) by site and keyword. Every span is kept as a JSON
+    line, and added to a histogram by (span, site, keyword). Counters hold
+    values like the number of pages. Nothing is written without paths.
+    """
+    PREFIX = "jobsearcher"
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, spans_path=None, prometheus_path=None):
+        self.spans_path = spans_path
+        self.prometheus_path = prometheus_path
+        self.new_spans = list()
+        self.histograms = dict()
+        self.counters = dict()
+        self.lock = threading.Lock()
+
+    #####################################
+    ##Record spans and counters
+    @contextmanager
+    def span(self, name, site, keyword=None):
+        """Time the block inside the with statement"""
+        started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, site, keyword, time.perf_counter() - start,
+                         started_at)
+
+    def observe(self, name, site, keyword, seconds, started_at=None):
+        """Record a span that was timed somewhere else"""
+        started_at = started_at or datetime.now()
+        key = (name, site, keyword or "")
+        with self.lock:
+            self.new_spans.append({
+                'span': name, 'site': site, 'keyword': keyword,
+                'start': started_at.isoformat(timespec='milliseconds'),
+                'seconds': round(seconds, 6)})
+            histogram = self.histograms.setdefault(
+                key, {'buckets': [0]*len(self.BUCKETS), 'sum': 0.0,
+                      'count': 0})
+            for num, upper_bound in enumerate(self.BUCKETS):
+                if seconds <= upper_bound:
+                    histogram['buckets'][num] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def increment(self, name, site, keyword=None, value=1):
+        """Add a value to a counter (e.g. 'pages')"""
+        key = (name, site, keyword or "")
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    #####################################
+    ##Export
+    def get_prometheus_text(self):
+        """Get histograms and counters in the Prometheus text format"""
+        metric = self.PREFIX + "_span_seconds"
+        lines = ["# HELP {} Duration of the crawl steps".format(metric),
+                 "# TYPE {} histogram".format(metric)]
+        with self.lock:
+            for (name, site, keyword), histogram in sorted(
+                    self.histograms.items()):
+                labels = [('span', name), ('site', site), ('keyword', keyword)]
+                for upper_bound, count in zip(self.BUCKETS,
+                                              histogram['buckets']):
+                    lines.append("{}_bucket{} {}".format(
+                        metric, format_labels(labels + [('le', upper_bound)]),
+                        count))
+                lines.append("{}_bucket{} {}".format(
+                    metric, format_labels(labels + [('le', '+Inf')]),
+                    histogram['count']))
+                lines.append("{}_sum{} {}".format(
+                    metric, format_labels(labels), histogram['sum']))
+                lines.append("{}_count{} {}".format(
+                    metric, format_labels(labels), histogram['count']))
+            counter = None
+            for (name, site, keyword), value in sorted(self.counters.items()):
+                if counter != "{}_{}_total".format(self.PREFIX, name):
+                    counter = "{}_{}_total".format(self.PREFIX, name)
+                    lines.append("# TYPE {} counter".format(counter))
+                lines.append("{}{} {}".format(
+                    counter, format_labels([('site', site),
+                                            ('keyword', keyword)]), value))
+        return "\n".join(lines) + "\n"
+
+    def save(self):
+        """Append the new spans to the JSON lines file, and rewrite the
+        Prometheus file with the totals of the run"""
+        with self.lock:
+            new_spans, self.new_spans = self.new_spans, list()
+        if self.spans_path and new_spans:
+            with open(self.spans_path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(span) + '\n' for span in new_spans)
+        if self.prometheus_path:
+            with open(self.prometheus_path, 'w', encoding='utf-8') as file:
+                file.write(self.get_prometheus_text())
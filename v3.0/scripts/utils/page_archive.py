@@ -0,0 +1,75 @@
+"""
+Compressed archive of the raw result pages, so they can be parsed again
+"""
+import os
+import re
+import gzip
+import json
+import threading
+from datetime import datetime
+import unidecode
+
+class PageArchive:
+    """
+    Class that stores page sources gzipped by site, date, keyword and page
+    number, with a JSON lines index holding the xPaths used for each page.
+    """
+    INDEX_NAME = "index.jsonl"
+
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_slug(cls, keyword):
+        """Get a file system friendly version of a keyword"""
+        slug = unidecode.unidecode(keyword.lower().strip())
+        return re.sub(r'[^0-9a-z]+', '-', slug).strip('-')
+
+    #####################################
+    ##Save and load pages
+    def save_page(self, site, keyword, page, page_source, x_paths):
+        """Compress and store a page source, and add it to the index"""
+        if not page_source:
+            return
+        archived_at = datetime.now()
+        file_name = os.path.join(site, str(archived_at.date()),
+                                 self.get_slug(keyword),
+                                 "page-{:03d}.html.gz".format(page))
+        entry = {'site': site, 'keyword': keyword, 'page': page,
+                 'file': file_name, 'x_paths': dict(x_paths),
+                 'archived_at': archived_at.isoformat(timespec='seconds')}
+        full_name = os.path.join(self.path, file_name)
+        os.makedirs(os.path.dirname(full_name), exist_ok=True)
+        with gzip.open(full_name, 'wt', encoding='utf-8') as file:
+            file.write(page_source)
+        with self.lock:
+            with open(os.path.join(self.path, self.INDEX_NAME), 'a',
+                      encoding='utf-8') as file:
+                file.write(json.dumps(entry) + '\n')
+
+    def read_index(self, sites=None):
+        """Get the index entries, only the last one for pages archived
+        more than once, optionally filtered by site"""
+        entries = dict()
+        index_name = os.path.join(self.path, self.INDEX_NAME)
+        if os.path.isfile(index_name):
+            with open(index_name, 'r', encoding='utf-8') as file:
+                for line in file:
+                    entry = json.loads(line)
+                    if sites is None or entry['site'] in sites:
+                        entries[entry['file']] = entry
+        return list(entries.values())
+
+    def load_page(self, entry):
+        """Get the page source of an index entry"""
+        with gzip.open(os.path.join(self.path, entry['file']), 'rt',
+                       encoding='utf-8') as file:
+            return file.read()
+
+    def iter_pages(self, sites=None):
+        """Yield (entry, page_source) for every archived page"""
+        for entry in self.read_index(sites):
+            yield entry, self.load_page(entry)
@@ -0,0 +1,188 @@
+"""
+Statistics of the links found by each keyword search, and planning of the
+keyword/site searches of the next crawl from them
+"""
+import threading
+from datetime import datetime
+from utils.link_index import SeenLinkIndex
+
+class SearchStats:
+    """
+    Links found by every (site, keyword) search of a crawl: pages loaded,
+    hashed links, the ones that were unknown when the crawl started (new
+    links) and the last page with a new link. Overlaps between keywords of
+    the same site are computed from the hashed links.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self):
+        self.searches = dict()
+        self.lock = threading.Lock()
+        self.run_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+
+    #####################################
+    ##Record pages
+    def add_page(self, site, keyword, page, links, seen_links):
+        """Record the links of a processed page"""
+        digests = {SeenLinkIndex.hash_link(link) for link in links}
+        new_digests = {SeenLinkIndex.hash_link(link) for link in links
+                       if not seen_links.was_known(link)}
+        with self.lock:
+            search = self.searches.setdefault(
+                (site, keyword), {'pages': 0, 'links': set(),
+                                  'new_links': set(), 'last_new_page': 0})
+            search['pages'] += 1
+            search['links'] |= digests
+            search['new_links'] |= new_digests
+            if new_digests and page:
+                search['last_new_page'] = max(search['last_new_page'], page)
+
+    #####################################
+    ##Get rows for DB
+    def get_searched(self):
+        """Get the (keyword, site) pairs that were searched"""
+        with self.lock:
+            return [(keyword, site) for site, keyword in self.searches]
+
+    def get_stats_rows(self):
+        """Get (keyword, site, run_at, pages, links, new_links,
+        last_new_page) rows of every search"""
+        with self.lock:
+            return [(keyword, site, self.run_at, search['pages'],
+                     len(search['links']), len(search['new_links']),
+                     search['last_new_page'])
+                    for (site, keyword), search in self.searches.items()]
+
+    def get_overlap_rows(self):
+        """Get (keyword, site, other_keyword, run_at, shared) rows with the
+        links of a search also found by another keyword of the site"""
+        with self.lock:
+            return [(keyword, site, other_keyword, self.run_at,
+                     len(search['links'] & other_search['links']))
+                    for (site, keyword), search in self.searches.items()
+                    for (other_site, other_keyword), other_search
+                    in self.searches.items()
+                    if other_site == site and other_keyword != keyword]
+
+class QueryPlanner:
+    """
+    Plans the keywords of each site from the stats of their last runs:
+    - Keywords whose links are mostly found by another keyword of the site
+    (overlap) are merged into it: they aren't searched, and the other one
+    gets their page budget if it is larger.
+    - Keywords without new links in their last runs are skipped.
+    - Page budgets go up to the last page where new links appeared (plus
+    some extra pages), and keywords are ordered by new links per page.
+    Keywords without enough runs, or that weren't searched (Search table)
+    for reprobe_days, are searched with max_pages, so skipped keywords are
+    checked again from time to time.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, stats_rows=(), overlap_rows=(), search_dates=None,
+                 **kwargs):
+        self.max_pages = kwargs.get('max_pages', 50)
+        self.min_pages = kwargs.get('min_pages', 2)
+        self.extra_pages = kwargs.get('extra_pages', 2)
+        self.num_runs = kwargs.get('num_runs', 3)
+        self.merge_overlap = kwargs.get('merge_overlap', 0.9)
+        self.reprobe_days = kwargs.get('reprobe_days', 7)
+        self.today = kwargs.get('today') or datetime.now().date()
+        #Totals by (site, keyword): runs, pages, links, new_links and the
+        #max of last_new_page
+        self.stats = {(site, keyword): {'runs': runs, 'pages': pages,
+                                        'links': links, 'new_links': new_links,
+                                        'last_new_page': last_new_page}
+                      for (keyword, site, runs, pages, links, new_links,
+                           last_new_page) in stats_rows}
+        #Links shared with another keyword, and links of the keyword, in
+        #the runs where both were searched
+        self.overlaps = {(site, keyword, other_keyword): (runs, shared, links)
+                         for (keyword, site, other_keyword, runs, shared,
+                              links) in overlap_rows}
+        self.search_dates = search_dates or dict()
+
+    @classmethod
+    def load(cls, dbc, **kwargs):
+        """Create a planner with the stats stored in DB"""
+        num_runs = kwargs.get('num_runs', 3)
+        return cls(dbc.get_search_stats(num_runs),
+                   dbc.get_search_overlaps(num_runs),
+                   dbc.get_search_dates(), **kwargs)
+
+    #####################################
+    ##Plan searches
+    def needs_probe(self, site, keyword):
+        """Check if a keyword must be searched in full: not enough runs, or
+        not searched for reprobe_days"""
+        stats = self.stats.get((site, keyword))
+        update_date = self.search_dates.get((keyword, site))
+        return (stats is None or stats['runs'] < self.num_runs
+                or update_date is None
+                or (self.today - update_date).days >= self.reprobe_days)
+
+    def get_page_budget(self, site, keyword):
+        """Pages worth loading for a keyword"""
+        if self.needs_probe(site, keyword):
+            return self.max_pages
+        return min(self.max_pages,
+                   max(self.min_pages, self.stats[(site, keyword)]
+                       ['last_new_page'] + self.extra_pages))
+
+    def get_yield(self, site, keyword):
+        """New links per page loaded (infinite for keywords to probe, so
+        they go first)"""
+        if self.needs_probe(site, keyword):
+            return float('inf')
+        stats = self.stats[(site, keyword)]
+        return stats['new_links']/max(1, stats['pages'])
+
+    def get_covering_keyword(self, site, keyword, kept_keywords):
+        """Get the kept keyword that finds most links of a keyword (None if
+        none reaches merge_overlap)"""
+        best_keyword, best_overlap = None, self.merge_overlap
+        for other_keyword in kept_keywords:
+            runs, shared, links = self.overlaps.get(
+                (site, keyword, other_keyword), (0, 0, 0))
+            if (runs >= self.num_runs and links
+                    and shared/links >= best_overlap):
+                best_keyword, best_overlap = other_keyword, shared/links
+        return best_keyword
+
+    def plan_site(self, site, keywords):
+        """Plan the searches of a site. Returns the keywords to search
+        (ordered), their page budgets, and the reason why the other
+        keywords are left out"""
+        budgets = {keyword: self.get_page_budget(site, keyword)
+                   for keyword in keywords}
+        skipped = dict()
+        kept_keywords = list()
+        #Keywords with more links are kept first, so they absorb the others
+        for keyword in sorted(keywords, key=lambda keyword: -self.stats.get(
+                (site, keyword), {}).get('links', 0)):
+            if self.needs_probe(site, keyword):
+                kept_keywords.append(keyword)
+            elif self.stats[(site, keyword)]['new_links'] == 0:
+                skipped[keyword] = "no new links in the last runs"
+            else:
+                covering_keyword = self.get_covering_keyword(site, keyword,
+                                                             kept_keywords)
+                if covering_keyword is None:
+                    kept_keywords.append(keyword)
+                else:
+                    skipped[keyword] = "merged into " + covering_keyword
+                    budgets[covering_keyword] = max(budgets[covering_keyword],
+                                                    budgets[keyword])
+        kept_keywords.sort(key=lambda keyword: -self.get_yield(site, keyword))
+        return {'keywords': kept_keywords,
+                'page_budgets': {keyword: budgets[keyword]
+                                 for keyword in kept_keywords},
+                'skipped': skipped}
+
+    def print_plan(self, site, plan):
+        """Print the planned searches of a site"""
+        for keyword in plan['keywords']:
+            print(site + ": Planned search: ", keyword,
+                  plan['page_budgets'][keyword], "pages")
+        for keyword, reason in plan['skipped'].items():
+            print(site + ": Skipped search: ", keyword, "-", reason)
@@ -0,0 +1,103 @@
+"""
+Event driven readiness waits for Selenium controlled pages
+"""
+import time
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
+
+class ReadinessWaiter:
+    """
+    Class that waits for elements and for the DOM to settle (no elements
+    added or removed for a quiet period), within a time budget for every
+    kind of wait. The time taken by each wait is recorded.
+    """
+    DEFAULT_BUDGETS = {'element': 10, 'extras': 15, 'idle': 5,
+                       'quiet_ms': 250, 'poll': 0.1}
+    #Observes the elements added or removed in the parent of the first node
+    #of an xPath (the body if none), so attribute changes of carousels and
+    #ads don't count, and checks that the document is complete and quiet
+    #for the given milliseconds. The observer moves if the parent changes
+    DOM_IDLE_SCRIPT = """
+        var w = window;
+        var target = null;
+        if (arguments[1]) {
+            var node = document.evaluate(
+                arguments[1], document, null,
+                XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+            target = node && node.parentNode;
+        }
+        target = target || document.body || document.documentElement;
+        if (!w.__readiness || w.__readiness.target !== target) {
+            if (w.__readiness) {
+                w.__readiness.observer.disconnect();
+            }
+            var state = {last: Date.now(), target: target};
+            state.observer = new MutationObserver(function () {
+                state.last = Date.now();
+            });
+            state.observer.observe(target, {childList: true, subtree: true});
+            w.__readiness = state;
+        }
+        return document.readyState === 'complete' &&
+            Date.now() - w.__readiness.last >= arguments[0];"""
+    CONDITIONS = {'presence': EC.presence_of_element_located,
+                  'clickable': EC.element_to_be_clickable,
+                  'visible': EC.visibility_of_element_located}
+
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, driver, budgets=None):
+        self.driver = driver
+        self.budgets = dict(self.DEFAULT_BUDGETS, **(budgets or {}))
+        self.wait_times = dict()
+
+    #####################################
+    ##Waits
+    def wait_until(self, name, condition, budget):
+        """Wait until condition is true or the budget (seconds) runs out,
+        recording the time it took. Returns if the condition was met"""
+        start = time.perf_counter()
+        try:
+            WebDriverWait(self.driver, budget,
+                          poll_frequency=self.budgets['poll']).until(condition)
+        except TimeoutException:
+            ready = False
+        else:
+            ready = True
+        self.wait_times.setdefault(name, []).append(
+            time.perf_counter() - start)
+        return ready
+
+    def wait_for_element(self, x_path, condition='presence', **kwargs):
+        """Wait for element defined by x_path to meet a condition
+        (presence, clickable or visible)"""
+        budget = kwargs.get('wait_seconds',
+                            self.budgets[kwargs.get('budget', 'element')])
+        return self.wait_until(condition,
+                               self.CONDITIONS[condition]((By.XPATH, x_path)),
+                               budget)
+
+    def wait_for_dom_idle(self, x_path=None, **kwargs):
+        """Wait for the elements around the first node of x_path (or the
+        whole body) to stop being added or removed"""
+        quiet_ms = kwargs.get('quiet_ms', self.budgets['quiet_ms'])
+        budget = kwargs.get('wait_seconds', self.budgets['idle'])
+        def dom_is_idle(driver):
+            try:
+                return driver.execute_script(self.DOM_IDLE_SCRIPT, quiet_ms,
+                                             x_path)
+            except WebDriverException:
+                return False
+        return self.wait_until('dom_idle', dom_is_idle, budget)
+
+    #####################################
+    ##Recorded wait times
+    def get_wait_summary(self):
+        """Get the number of waits, total and max seconds by kind of wait"""
+        return {name: {'count': len(times),
+                       'total': round(sum(times), 3),
+                       'max': round(max(times), 3)}
+                for name, times in self.wait_times.items()}
@@ -0,0 +1,98 @@
+"""
+Blocking of the resources that aren't needed to read the result cards
+(images, fonts, ads, analytics), and measure of the bytes loaded per page
+"""
+from urllib.parse import urlparse
+from selenium.common.exceptions import WebDriverException
+
+#URL patterns (Network.setBlockedURLs wildcards) of each resource type
+RESOURCE_PATTERNS = {
+    'image': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*',
+              '*.ico*'],
+    'font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*'],
+    'stylesheet': ['*.css*']}
+#Bytes of the resources loaded since the last call, the size of the
+#document and the time origin (it changes when a new document is loaded)
+PAGE_BYTES_SCRIPT = """
+performance.setResourceTimingBufferSize(5000);
+var entries = performance.getEntriesByType('resource');
+var navigation = performance.getEntriesByType('navigation')[0];
+performance.clearResourceTimings();
+return [entries.reduce(function (sum, entry) {
+            return sum + (entry.transferSize || 0);}, 0),
+        navigation ? navigation.transferSize : 0,
+        performance.timeOrigin,
+        entries.map(function (entry) {return entry.name;})];
+"""
+
+def get_chrome_prefs(blocked_types):
+    """Chrome preferences that disable the blocked content types"""
+    prefs = dict()
+    if 'image' in blocked_types:
+        prefs['profile.managed_default_content_settings.images'] = 2
+    return prefs
+
+class ResourceBlocker:
+    """
+    Blocks resources of a driver through the DevTools protocol: by resource
+    type, and by domain for the ones not in the allowed domains of the site.
+    Since only blocklists are supported, domains are blocked as soon as a
+    page requests them, so they aren't loaded by the next pages.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, driver, blocked_types=(), allowed_domains=None):
+        self.driver = driver
+        self.blocked_patterns = [pattern for resource_type in blocked_types
+                                 for pattern in RESOURCE_PATTERNS[resource_type]]
+        self.allowed_domains = allowed_domains
+        self.blocked_domains = set()
+        self.time_origin = None
+
+    def enable(self):
+        """Start blocking. Returns False if the driver doesn't support it"""
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.update_blocked_urls()
+        except (AttributeError, WebDriverException):
+            return False
+        return True
+
+    def update_blocked_urls(self):
+        """Send the blocked URL patterns to the browser"""
+        urls = self.blocked_patterns + ["*://{}/*".format(domain)
+                                        for domain in sorted(self.blocked_domains)]
+        self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+
+    def is_allowed_domain(self, domain):
+        """Check if a domain (or one of its parents) is allowed"""
+        return (self.allowed_domains is None
+                or any(domain == allowed or domain.endswith('.' + allowed)
+                       for allowed in self.allowed_domains))
+
+    #####################################
+    ##Measure pages
+    def get_page_bytes(self):
+        """Get the bytes transferred since the last call (the document
+        only counts when a new one was loaded), and block the domains out
+        of the allowed ones"""
+        try:
+            resource_bytes, document_bytes, time_origin, urls = (
+                self.driver.execute_script(PAGE_BYTES_SCRIPT))
+        except WebDriverException:
+            return 0
+        page_bytes = resource_bytes
+        if time_origin != self.time_origin:
+            page_bytes += document_bytes
+            self.time_origin = time_origin
+        new_domains = {urlparse(url).hostname for url in urls} - {None}
+        new_domains = {domain for domain in new_domains - self.blocked_domains
+                       if not self.is_allowed_domain(domain)}
+        if new_domains:
+            self.blocked_domains |= new_domains
+            try:
+                self.update_blocked_urls()
+            except WebDriverException:
+                pass
+        return page_bytes
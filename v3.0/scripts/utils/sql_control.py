@@ -2,18 +2,24 @@
 Controls the data flow between SQL database and the program
 """
 import os
+import re
 import sqlite3
 from datetime import timedelta, datetime
+from functools import lru_cache
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 #pylint: disable=import-error
 import project_constants as prc
+from utils.fingerprint import (estimate_similarity, get_band_keys, get_city,
+                               get_fingerprint, get_minhash, normalize_text)
 #pylint: enable=import-error
 
 class SearchHelper:
     """Helper class for containing search parameters and generating
-    SQL queries for searches"""
+    SQL queries for searches. Queries are templates with bound parameters,
+    compiled once per shape (which filters are used and how many keywords),
+    so sqlite reuses its cached statements between searches"""
     #####################################
     ##Initialize instance of the class
     def __init__(self):
@@ -21,14 +27,36 @@ class SearchHelper:
         self.keywords_and = None
         self.keywords_or = None
         self.only_non_opened = None
+        #Leave out postings that duplicate others from another site
+        self.hide_duplicates = None
+        #Full-text search on DataSearch (FTS5) instead of LIKE clauses
+        self.use_fts = False
+        self.search_columns = ['job']
 
     #####################################
     ##Generate SQL query from search parameters
     def generate_sql_query(self):
-        """Generate SQL query according to search parameters"""
+        """Generate SQL query template and its parameters according to
+        search parameters"""
+        date_parameters = self.generate_date_parameters()
+        keyword_parameters = self.generate_keyword_parameters()
+        shape = (bool(date_parameters),
+                 self.use_fts,
+                 tuple(len(group) for group in keyword_parameters),
+                 bool(self.only_non_opened),
+                 bool(self.hide_duplicates))
+        parameters = list(date_parameters)
+        for group in keyword_parameters:
+            parameters += group
+        return self.compile_sql_query(shape), parameters
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def compile_sql_query(cls, shape):
+        """Compile the SQL query template for a query shape"""
         query_string = ""
         #Generate query strings
-        for string in self.generate_particular_query():
+        for string in cls.generate_particular_query(shape):
             if string == "":
                 continue
             if query_string != "":
@@ -36,55 +64,182 @@ class SearchHelper:
             query_string += string
         if query_string != "":
             query_string = "\nWHERE " + query_string
-        query_string = "SELECT * FROM Data " + query_string
+        if "DataSearch MATCH" in query_string:
+            query_string = ("SELECT Data.* FROM Data JOIN DataSearch"
+                            "\nON DataSearch.rowid = Data.id " + query_string)
+        else:
+            query_string = "SELECT * FROM Data " + query_string
         return query_string
 
-    def generate_particular_query(self):
-        """Generate variable SQL query part based on parameters"""
+    @classmethod
+    def generate_particular_query(cls, shape):
+        """Generate variable SQL query part based on the query shape"""
+        use_date, use_fts, group_sizes, only_non_opened, hide_duplicates = shape
         query_parts = list()
-        query_parts.append(self.generate_date_query_string())
-        query_parts += self.generate_keyword_query_string()
-        if self.only_non_opened:
+        if use_date:
+            query_parts.append("date >= ?")
+        if use_fts:
+            query_parts += ["DataSearch MATCH ?" for _ in group_sizes]
+        else:
+            query_parts += [cls.generate_partial_keyword_string(size, "or")
+                            for size in group_sizes]
+        if only_non_opened:
             query_parts.append("NOT opened")
+        if hide_duplicates:
+            query_parts.append("coalesce(duplicate_of, 0) = 0")
         return query_parts
 
-    def generate_date_query_string(self):
-        """Obtain date query string"""
+    def generate_date_parameters(self):
+        """Obtain date parameter (ISO string, compared as text)"""
         if self.max_past_days:
             limit_date = datetime.now().date() - timedelta(
                 days = self.max_past_days)
-            date_string = "date >= " + str(limit_date)
-        else:
-            date_string = ""
-        return date_string
+            return [str(limit_date)]
+        return []
+
+    @classmethod
+    def generate_partial_keyword_string(cls, length_keywords, logic):
+        """Generate partial strings based on and/or logic and a number of
+        keyword parameters"""
+        logic_link = "\n" + logic.upper().strip() + " "
+        keyword_string = logic_link.join(["job LIKE ?"]*length_keywords)
+        return "(" + keyword_string + ")"
 
     @classmethod
-    def generate_partial_keyword_string(cls, keywords, logic):
-        """Generate partial strings based on and/or logic and an
-        array of keyword"""
-        keyword_string = ""
-        if (not keywords) or keywords == []:
-            return keyword_string
-        logic_link = logic.upper().strip()
-        length_keywords = len(keywords)
-        for idx, keyword in enumerate(keywords):
-            keyword_string += "job LIKE \"%{}%\" ".format(keyword)
-            if idx+1 < length_keywords:
-                keyword_string += logic_link
-            keyword_string += "\n"
-        keyword_string = "(" + keyword_string + ")"
-        return keyword_string
-
-    def generate_keyword_query_string(self):
-        """Create keyword query strings for the or/or logic"""
-        keyword_string_and = self.generate_partial_keyword_string(
-            self.keywords_and, "or")
-        keyword_string_or = self.generate_partial_keyword_string(
-            self.keywords_or, "or")
-        return [keyword_string_and, keyword_string_or]
+    def generate_partial_match_string(cls, keywords, logic):
+        """Generate a FTS5 MATCH expression based on and/or logic and an
+        array of keywords. Keywords are prefixes, like in LIKE "%kw%"
+        searches (e.g. instrum, electric)"""
+        terms = list()
+        for keyword in keywords or []:
+            tokens = re.findall(r'\w+', keyword.lower())
+            if tokens:
+                terms.append('"{}"*'.format(" ".join(tokens)))
+        if not terms:
+            return ""
+        logic_link = " " + logic.upper().strip() + " "
+        return "(" + logic_link.join(terms) + ")"
+
+    def generate_match_parameter(self):
+        """Create a single MATCH expression for the or/or logic, restricted
+        to the search columns"""
+        columns = "{" + " ".join(self.search_columns) + "}"
+        match_parts = [self.generate_partial_match_string(keywords, "or")
+                       for keywords in (self.keywords_and, self.keywords_or)]
+        return " AND ".join(columns + " : " + part
+                            for part in match_parts if part)
+
+    def generate_keyword_parameters(self):
+        """Create keyword parameter groups for the or/or logic. Empty groups
+        are left out"""
+        if self.use_fts:
+            match_string = self.generate_match_parameter()
+            return [[match_string]] if match_string else []
+        return [["%{}%".format(keyword) for keyword in keywords]
+                for keywords in (self.keywords_and, self.keywords_or)
+                if keywords]
 
 class DBControl:
     """Class for controlling DB - I/O interaction"""
+    DATA_COLUMNS = ('job', 'company', 'location', 'date', 'site', 'opened',
+                    'link', 'fingerprint')
+    #Schema migrations, applied in order. PRAGMA user_version stores the
+    #number of migrations already applied to a DB
+    SCHEMA_MIGRATIONS = [
+        #1: Unique links (keeping the first row and the opened status) and
+        #indexes for the usual filters
+        ["""UPDATE Data SET opened = 1
+         WHERE link IN (SELECT link FROM Data WHERE opened);""",
+         """DELETE FROM Data
+         WHERE id NOT IN (
+         SELECT min(id) FROM Data
+         GROUP BY link);""",
+         """CREATE UNIQUE INDEX IF NOT EXISTS "idx_data_link"
+         ON "Data" ("link");""",
+         """CREATE INDEX IF NOT EXISTS "idx_data_date" ON "Data" ("date");""",
+         """CREATE INDEX IF NOT EXISTS "idx_data_site" ON "Data" ("site");""",
+         """CREATE INDEX IF NOT EXISTS "idx_data_opened"
+         ON "Data" ("opened");"""],
+        #2: Full-text search table over job, company and location, kept in
+        #sync with Data by triggers
+        ["""CREATE VIRTUAL TABLE IF NOT EXISTS "DataSearch" USING fts5(
+         job, company, location, content='Data', content_rowid='id',
+         tokenize='unicode61 remove_diacritics 2');""",
+         """CREATE TRIGGER IF NOT EXISTS "data_search_insert"
+         AFTER INSERT ON Data BEGIN
+         INSERT INTO DataSearch(rowid, job, company, location)
+         VALUES (new.id, new.job, new.company, new.location);
+         END;""",
+         """CREATE TRIGGER IF NOT EXISTS "data_search_delete"
+         AFTER DELETE ON Data BEGIN
+         INSERT INTO DataSearch(DataSearch, rowid, job, company, location)
+         VALUES ('delete', old.id, old.job, old.company, old.location);
+         END;""",
+         """CREATE TRIGGER IF NOT EXISTS "data_search_update"
+         AFTER UPDATE OF job, company, location ON Data BEGIN
+         INSERT INTO DataSearch(DataSearch, rowid, job, company, location)
+         VALUES ('delete', old.id, old.job, old.company, old.location);
+         INSERT INTO DataSearch(rowid, job, company, location)
+         VALUES (new.id, new.job, new.company, new.location);
+         END;""",
+         """INSERT INTO DataSearch(DataSearch) VALUES ('rebuild');"""],
+        #3: Date and time when a posting was opened
+        ["""ALTER TABLE "Data" ADD COLUMN "opened_at" TEXT;"""],
+        #4: Fingerprint of job/company/city, and the id of the posting that
+        #a row duplicates (NULL: not checked yet, 0: it isn't a duplicate).
+        #DataBands holds the MinHash LSH bands of the checked rows
+        ["""ALTER TABLE "Data" ADD COLUMN "fingerprint" TEXT;""",
+         """ALTER TABLE "Data" ADD COLUMN "duplicate_of" INTEGER;""",
+         """CREATE INDEX IF NOT EXISTS "idx_data_fingerprint"
+         ON "Data" ("fingerprint");""",
+         """CREATE INDEX IF NOT EXISTS "idx_data_unchecked"
+         ON "Data" ("id") WHERE duplicate_of IS NULL;""",
+         """CREATE TABLE IF NOT EXISTS "DataBands" (
+         "band" TEXT,
+         "data_id" INTEGER);""",
+         """CREATE INDEX IF NOT EXISTS "idx_databands_band"
+         ON "DataBands" ("band");"""],
+        #5: Links found by each keyword/site search of a run (the new ones
+        #were unknown before it), and the ones shared with other keywords
+        ["""CREATE TABLE IF NOT EXISTS "SearchStats" (
+         "keyword" TEXT,
+         "site" TEXT,
+         "run_at" TEXT,
+         "pages" INTEGER,
+         "links" INTEGER,
+         "new_links" INTEGER,
+         "last_new_page" INTEGER);""",
+         """CREATE INDEX IF NOT EXISTS "idx_searchstats_search"
+         ON "SearchStats" ("keyword", "site", "run_at");""",
+         """CREATE TABLE IF NOT EXISTS "SearchOverlap" (
+         "keyword" TEXT,
+         "site" TEXT,
+         "other_keyword" TEXT,
+         "run_at" TEXT,
+         "shared" INTEGER);"""],
+        #6: Index for the duplicates of opened postings, and check every row
+        #again, since duplicates are only searched in other sites now
+        ["""CREATE INDEX IF NOT EXISTS "idx_data_duplicate_of"
+         ON "Data" ("duplicate_of");""",
+         """DELETE FROM DataBands;""",
+         """UPDATE Data SET duplicate_of = NULL;"""],
+        #7: Date of the posting in DataBands, so rows sharing a band are
+        #only searched within the date window
+        ["""ALTER TABLE "DataBands" ADD COLUMN "date" TEXT;""",
+         """UPDATE DataBands SET date = (
+         SELECT date FROM Data WHERE Data.id = DataBands.data_id);""",
+         """DROP INDEX IF EXISTS "idx_databands_band";""",
+         """CREATE INDEX IF NOT EXISTS "idx_databands_band_date"
+         ON "DataBands" ("band", "date");"""]]
+    #Stats of the last runs (bound parameter) of each keyword/site search
+    RECENT_SEARCH_STATS = """WITH Recent AS (
+                    SELECT * FROM (
+                    SELECT *, row_number() OVER (
+                    PARTITION BY keyword, site ORDER BY run_at DESC) AS num
+                    FROM SearchStats)
+                    WHERE num <= ?)"""
+    #Max number of bound parameters in a sqlite statement (old versions)
+    MAX_SQL_VARIABLES = 999
     DATABASE_PATH = r"C:\Users\PC-UVW0102\Desktop\Databases\\"[:-1]
     CHROMEDRIVER_PATH = r"C:\Program Files\chromedriver_win32\chromedriver.exe"
     USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
@@ -108,23 +263,24 @@ class DBControl:
         self.point_or_clear_db(db_name, clear = clear)
         self.connect_to_db()
         self.create_tables(self.tables_exist())
+        self.migrate_schema()
 
     def point_or_clear_db(self, db_name, clear = False):
         """Load db_path attribute to point to db, and clears it on
         condition."""
         self.db_path = self.DATABASE_PATH + db_name
-        if clear or not os.path.isfile(self.db_path):
+        if clear and os.path.isfile(self.db_path):
             os.remove(self.db_path)
 
     def connect_to_db(self):
         """Connects to a DB. Creates it if don't exist or is cleared"""
-        self.connection = sqlite3.connect(self.db_path)
+        self.connection = sqlite3.connect(self.db_path, timeout = 30)
         self.connection.row_factory = lambda cursor, row: list(row)
         self.cursor = self.connection.cursor()
 
-    def tables_exist(self):
+    def tables_exist(self, table_names = None):
         """Check if the required tables exist"""
-        table_names = ['Data', 'Search']
+        table_names = table_names or ['Data', 'Search']
         sql_query = """SELECT name FROM sqlite_master
                     WHERE type='table'
                     ORDER BY name;"""
@@ -156,33 +312,141 @@ class DBControl:
         if sum(created_status)>0:
             self.connection.commit()
 
+    def migrate_schema(self):
+        """Apply the schema migrations missing in DB, each one in a single
+        transaction. Migrations that need a module missing in the SQLite
+        build (FTS5) are skipped, and searches use LIKE clauses instead"""
+        version = self.cursor.execute("PRAGMA user_version;").fetchall()[0][0]
+        for index in range(version, len(self.SCHEMA_MIGRATIONS)):
+            self.cursor.execute("BEGIN;")
+            try:
+                for sql_query in self.SCHEMA_MIGRATIONS[index]:
+                    self.cursor.execute(sql_query)
+            except sqlite3.OperationalError as error:
+                if "no such module" not in str(error):
+                    raise
+                print("Migration {} skipped: ".format(index + 1), error)
+                self.connection.rollback()
+                self.cursor.execute("BEGIN;")
+            self.cursor.execute("PRAGMA user_version = {};".format(index + 1))
+            self.connection.commit()
+
     #####################################
     ##Update Data and Search tables provided relevant data
+    def upsert_data_rows(self, rows):
+        """Insert rows (tuples ordered as DATA_COLUMNS) in data table in a
+        single transaction. Existing links keep their id and date, get the
+        new job/company/location, and stay opened if they were. New rows,
+        and rows whose fingerprint changed, are checked for duplicates
+        afterwards"""
+        sql_query = """INSERT INTO Data ({})
+                    VALUES ({})
+                    ON CONFLICT(link) DO UPDATE SET
+                    job = excluded.job,
+                    company = excluded.company,
+                    location = excluded.location,
+                    opened = max(Data.opened, excluded.opened),
+                    fingerprint = excluded.fingerprint,
+                    duplicate_of = CASE
+                    WHEN Data.fingerprint IS excluded.fingerprint
+                    THEN Data.duplicate_of END;""".format(
+                        ", ".join(self.DATA_COLUMNS),
+                        ", ".join("?"*len(self.DATA_COLUMNS)))
+        with self.connection:
+            self.cursor.executemany(sql_query, rows)
+        self.index_duplicates()
+
+    def index_duplicates(self):
+        """Check the rows that weren't checked yet for duplicates (the same
+        posting from another site), oldest first. Candidates are the rows
+        of other sites with the same fingerprint or sharing a MinHash band,
+        within a date window, so only a few rows are compared for each new
+        one. Duplicates of a row checked again are checked again too, since
+        it can be a different posting now. Bands of the old values can be
+        left in DataBands: they only add candidates, which are compared with
+        their current values"""
+        with self.connection:
+            self.cursor.execute(
+                """UPDATE Data SET duplicate_of = NULL
+                WHERE duplicate_of IN (
+                SELECT id FROM Data WHERE duplicate_of IS NULL);""")
+        sql_query = """SELECT id, job, company, location, date, site,
+                    fingerprint FROM Data WHERE duplicate_of IS NULL
+                    ORDER BY date, id;"""
+        rows = self.cursor.execute(sql_query).fetchall()
+        with self.connection:
+            for (data_id, job, company, location, date, site,
+                 fingerprint) in rows:
+                fingerprint = fingerprint or get_fingerprint(job, company,
+                                                             location)
+                signature = get_minhash(job, company)
+                band_keys = get_band_keys(signature)
+                duplicate_of = self.find_original(
+                    data_id, fingerprint, signature, band_keys,
+                    (job, location, date, site))
+                self.cursor.execute(
+                    """UPDATE Data SET fingerprint = ?, duplicate_of = ?
+                    WHERE id = ?;""", [fingerprint, duplicate_of, data_id])
+                self.cursor.executemany(
+                    """INSERT INTO DataBands (band, data_id, date)
+                    VALUES (?, ?, ?);""",
+                    [(band_key, data_id, date) for band_key in band_keys])
+
+    def find_original(self, data_id, fingerprint, signature, band_keys,
+                      posting):
+        """Get the id of the posting of another site that a row (job,
+        location, date, site) duplicates (0 if none). Rows sharing only a
+        MinHash band need the same normalized job, so postings of a company
+        with numbered or similar titles aren't merged"""
+        job, location, date, site = posting
+        sql_query = """SELECT id, duplicate_of, job, company, location,
+                    fingerprint FROM Data
+                    WHERE (fingerprint = ? OR id IN (
+                    SELECT data_id FROM DataBands WHERE band IN ({})
+                    AND date BETWEEN date(?, ?) AND date(?, ?)))
+                    AND id != ? AND site != ? AND duplicate_of IS NOT NULL
+                    AND abs(julianday(date) - julianday(?)) <= ?
+                    ORDER BY id;""".format(", ".join("?"*len(band_keys)))
+        candidates = self.cursor.execute(
+            sql_query, [fingerprint] + band_keys
+            + [date, "-{} days".format(prc.DEDUP_DATE_WINDOW),
+               date, "+{} days".format(prc.DEDUP_DATE_WINDOW)]
+            + [data_id, site, date, prc.DEDUP_DATE_WINDOW]).fetchall()
+        city = get_city(location)
+        for (candidate_id, duplicate_of, candidate_job, candidate_company,
+             candidate_location, candidate_fingerprint) in candidates:
+            if candidate_fingerprint == fingerprint or (
+                    normalize_text(candidate_job) == normalize_text(job)
+                    and get_city(candidate_location) in (city, "")
+                    and estimate_similarity(signature, get_minhash(
+                        candidate_job, candidate_company))
+                    >= prc.DEDUP_SIMILARITY):
+                return duplicate_of or candidate_id
+        return 0
+
     def update_data_tbl(self, csv_name):
-        """Load csv and update data table with it"""
+        """Load csv and update data table with it. Not needed when items are
+        stored by the SQLiteStorePipeline, but useful for old CSVs"""
         dataframe = pd.read_csv(csv_name)
-        dataframe.to_sql('Data', self.connection, if_exists='append',
-                  index = False, chunksize = 10000)
-        self.erase_duplicates_data_tbl()
+        dataframe['opened'] = dataframe['opened'].astype(int)
+        if 'fingerprint' not in dataframe:
+            dataframe['fingerprint'] = [
+                get_fingerprint(job, company, location)
+                for job, company, location in zip(dataframe['job'],
+                                                  dataframe['company'],
+                                                  dataframe['location'])]
+        rows = dataframe[list(self.DATA_COLUMNS)].astype(object).values.tolist()
+        self.upsert_data_rows(rows)
 
-    def update_search_tbl(self, keyword_dict):
-        """Update search table with new dates"""
-        keyword_rows = list(list(item) for item in keyword_dict.items())
+    def update_search_tbl(self, keyword_sites):
+        """Update search table with new dates for (keyword, site) pairs"""
+        keyword_rows = list(list(item) for item in keyword_sites)
         dataframe = pd.DataFrame(keyword_rows, columns=["keyword", "site"])
         dataframe['update_date'] = datetime.now().date()
         dataframe.to_sql('Search', self.connection, if_exists='append',
                   index = False, chunksize = 10000)
         self.erase_duplicates_search_tbl()
 
-    def erase_duplicates_data_tbl(self, select_type = "min"):
-        """Erase duplicates in data table"""
-        sql_query = """DELETE FROM Data
-                    WHERE id NOT IN (
-                   	SELECT {}(id) FROM Data
-                   	GROUP BY link);""".format(select_type)
-        self.cursor.execute(sql_query).fetchall()
-        self.connection.commit()
-
     def erase_duplicates_search_tbl(self):
         """Erase duplicates in search table"""
         sql_query = """DELETE FROM Search
@@ -192,6 +456,58 @@ class DBControl:
         self.cursor.execute(sql_query).fetchall()
         self.connection.commit()
 
+    def save_search_stats(self, search_stats):
+        """Store the stats of the searches of a crawl (SearchStats) in a
+        single transaction"""
+        with self.connection:
+            self.cursor.executemany(
+                """INSERT INTO SearchStats (keyword, site, run_at, pages,
+                links, new_links, last_new_page)
+                VALUES (?, ?, ?, ?, ?, ?, ?);""",
+                search_stats.get_stats_rows())
+            self.cursor.executemany(
+                """INSERT INTO SearchOverlap (keyword, site, other_keyword,
+                run_at, shared) VALUES (?, ?, ?, ?, ?);""",
+                search_stats.get_overlap_rows())
+
+    def get_search_stats(self, num_runs):
+        """Get the totals of the last runs of each keyword/site search:
+        (keyword, site, runs, pages, links, new_links, last_new_page)"""
+        sql_query = self.RECENT_SEARCH_STATS + """
+                    SELECT keyword, site, count(*), sum(pages), sum(links),
+                    sum(new_links), max(last_new_page)
+                    FROM Recent GROUP BY keyword, site;"""
+        return self.cursor.execute(sql_query, [num_runs]).fetchall()
+
+    def get_search_overlaps(self, num_runs):
+        """Get the links of each keyword/site search shared with other
+        keywords in its last runs: (keyword, site, other_keyword, runs,
+        shared, links)"""
+        sql_query = self.RECENT_SEARCH_STATS + """
+                    SELECT SearchOverlap.keyword, SearchOverlap.site,
+                    other_keyword, count(*), sum(shared), sum(links)
+                    FROM SearchOverlap JOIN Recent
+                    ON Recent.keyword = SearchOverlap.keyword
+                    AND Recent.site = SearchOverlap.site
+                    AND Recent.run_at = SearchOverlap.run_at
+                    GROUP BY SearchOverlap.keyword, SearchOverlap.site,
+                    other_keyword;"""
+        return self.cursor.execute(sql_query, [num_runs]).fetchall()
+
+    def get_search_dates(self):
+        """Get the last update date of each (keyword, site) search"""
+        sql_query = """SELECT keyword, site, max(update_date) FROM Search
+                    GROUP BY keyword, site;"""
+        return {(keyword, site): datetime.strptime(update_date[:10],
+                                                   '%Y-%m-%d').date()
+                for keyword, site, update_date
+                in self.cursor.execute(sql_query).fetchall()}
+
+    def get_data_links(self):
+        """Get the set of links already stored in data table"""
+        sql_query = "SELECT link FROM Data;"
+        return {row[0] for row in self.cursor.execute(sql_query).fetchall()}
+
     @classmethod
     def generate_keyword_dict(cls, keywords):
         """Create the keyword dictionary from some keywords"""
@@ -203,7 +519,8 @@ class DBControl:
     #####################################
     ##Search in Data table for keywords and dates using SQL
     def search_in_data_tbl(self, max_past_days, keywords_and,
-                           keywords_or, only_non_opened = True):
+                           keywords_or, only_non_opened = True,
+                           hide_duplicates = True):
         """Search in data table and return a dataframe"""
         #Initialize attributes
         self.search_params = SearchHelper()
@@ -211,10 +528,12 @@ class DBControl:
         self.search_params.keywords_and = keywords_and
         self.search_params.keywords_or = keywords_or
         self.search_params.only_non_opened = only_non_opened
+        self.search_params.hide_duplicates = hide_duplicates
+        self.search_params.use_fts = self.tables_exist(['DataSearch'])[0]
         #Create query
-        sql_query = self.search_params.generate_sql_query()
-        print(sql_query)
-        data_list = self.cursor.execute(sql_query).fetchall()
+        sql_query, parameters = self.search_params.generate_sql_query()
+        print(sql_query, parameters)
+        data_list = self.cursor.execute(sql_query, parameters).fetchall()
         if data_list:
             dataframe = self.format_searched_data(data_list)
         else:
@@ -241,7 +560,8 @@ class DBControl:
         dataframe = self.search_in_data_tbl(prc.MAX_PAST_DAYS,
                                            prc.KEYWORDS_AND,
                                            prc.KEYWORDS_OR,
-                                           only_non_opened=prc.ONLY_NON_OPENED)
+                                           only_non_opened=prc.ONLY_NON_OPENED,
+                                           hide_duplicates=prc.HIDE_DUPLICATES)
         if dataframe is None or dataframe.empty:
             print("No matches were found")
         else:
@@ -270,11 +590,22 @@ class DBControl:
 
     def update_opened_data(self, dataframe):
         """Update opened data status in DB"""
-        dataframe['opened'] = True
-        dataframe.drop(['id'], axis=1, inplace=True)
-        dataframe.to_sql('Data', self.connection, if_exists='append',
-                  index = False, chunksize = 10000)
-        self.erase_duplicates_data_tbl(select_type="max")
+        self.mark_opened(dataframe['id'].tolist())
+
+    def mark_opened(self, ids):
+        """Set opened status and time for rows by id (and their duplicates
+        in other sites), in a single transaction with statements chunked
+        under the variable limit"""
+        opened_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+        chunk_size = (self.MAX_SQL_VARIABLES - 1)//2
+        with self.connection:
+            for index in range(0, len(ids), chunk_size):
+                chunk = ids[index:index + chunk_size]
+                placeholders = ", ".join("?"*len(chunk))
+                sql_query = """UPDATE Data SET opened = 1, opened_at = ?
+                            WHERE id IN ({}) OR duplicate_of IN ({});""".format(
+                                placeholders, placeholders)
+                self.cursor.execute(sql_query, [opened_at] + chunk + chunk)
 
 if __name__ == "__main__" :
     #DB creation and update
@@ -282,10 +613,12 @@ if __name__ == "__main__" :
     dbc.connect_and_check_db(prc.DB_NAME, clear = False)
     if prc.UPDATE_DB:
         dbc.update_data_tbl(prc.CSV_NAME)
-        dbc.update_search_tbl(dbc.generate_keyword_dict(prc.KEYWORDS))
+        dbc.update_search_tbl(
+            dbc.generate_keyword_dict(prc.KEYWORDS).items())
     #Search in DB - Parameters and conversion
     df = dbc.search_in_data_tbl(prc.MAX_PAST_DAYS,prc.KEYWORDS_AND,
-                        prc.KEYWORDS_OR, only_non_opened=prc.ONLY_NON_OPENED)
+                        prc.KEYWORDS_OR, only_non_opened=prc.ONLY_NON_OPENED,
+                        hide_duplicates=prc.HIDE_DUPLICATES)
     if df is None or df.empty:
         print("No matches were found")
     else:
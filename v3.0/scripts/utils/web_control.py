@@ -3,16 +3,28 @@ General tools common to website control
 """
 import re
 import time
+import queue
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 import unidecode
+from lxml import etree
+from scrapy.selector import Selector
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import WebDriverException
 #pylint: disable=import-error
 import project_constants as prc
+from utils.checkpoint import CrawlCheckpoint
+from utils.data_cleaner import select_data_cleaner
+from utils.driver_daemon import DriverDaemonClient
+from utils.link_index import SeenLinkIndex
+from utils.metrics import CrawlMetrics
+from utils.readiness import ReadinessWaiter
+from utils.resource_blocker import ResourceBlocker, get_chrome_prefs
+from utils.xpath_cache import XPathCache, get_structure_fingerprint
 #pylint: enable=import-error
 
 def select_website_control(param):
@@ -27,24 +39,224 @@ def select_website_control(param):
         ctl = ComputrabajoControl(**options)
     elif site == allowed_sites[2]:
         ctl = IndeedControl(**options)
+    if ctl:
+        ctl.seen_links = param.get('seen_links', SeenLinkIndex())
+        ctl.xpath_cache = param.get('xpath_cache', XPathCache())
+        ctl.cancel_event = param.get('cancel_event', threading.Event())
+        ctl.metrics = param.get('metrics', CrawlMetrics())
+        if prc.USE_DRIVER_DAEMON:
+            ctl.daemon = DriverDaemonClient(prc.DAEMON_ADDRESS,
+                                            prc.DAEMON_AUTHKEY_NAME)
     return ctl
 
+CARD_FIELDS = ('job', 'company', 'location', 'date', 'link')
+
+@lru_cache(maxsize=64)
+def compile_xpaths(x_path_values, thread_id):
+    """Compile the card xPaths. Cached by expressions, so they are only
+    compiled again when update_xpaths changes them, and by thread, since
+    compiled xPaths can't be evaluated concurrently"""
+    _ = thread_id
+    return [etree.XPath(x_path) for x_path in x_path_values]
+
+def extract_cards(page_source, x_paths):
+    """Extract the raw values of every card field in a page with a single
+    parse and precompiled xPaths. Returns a list of dicts with a list of
+    strings for each field"""
+    if not page_source:
+        return []
+    root = etree.HTML(page_source)
+    if root is None:
+        return []
+    x_path_values = (x_paths['cards'],) + tuple(x_paths[key]
+                                                for key in CARD_FIELDS)
+    cards_xpath, *field_xpaths = compile_xpaths(x_path_values,
+                                                threading.get_ident())
+    return [{key: [str(value) for value in x_path(card)]
+             for key, x_path in zip(CARD_FIELDS, field_xpaths)}
+            for card in cards_xpath(root)]
+
+class WebsiteControlPool:
+    """
+    Bounded pool of website controls (one headless driver each) for a
+    single site. Keyword searches run as asyncio tasks offloaded to the
+    threads of the pool (pool_size at most), and their pages are streamed
+    back as each search completes. Searches can be cancelled.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, param):
+        #Controls of the pool share the cancel event
+        self.cancel_event = threading.Event()
+        self.param = dict(param, cancel_event = self.cancel_event)
+        options = param.get('options', {})
+        self.pool_size = max(1, options.get('pool_size', 1))
+        self.timeout = options.get('timeout')
+        self.page_archive = param.get('page_archive')
+        self.checkpoint = param.get('checkpoint', CrawlCheckpoint())
+        self.idle_controls = queue.Queue()
+        self.controls = []
+
+    #####################################
+    ##Lease and release controls
+    def lease_control(self):
+        """Get an idle control, creating a new one if none is free"""
+        try:
+            ctl = self.idle_controls.get_nowait()
+        except queue.Empty:
+            ctl = select_website_control(self.param)
+            self.controls.append(ctl)
+        return ctl
+
+    def release_control(self, ctl):
+        """Return a control to the idle queue"""
+        self.idle_controls.put(ctl)
+
+    def close(self):
+        """Close the drivers of every control created by the pool"""
+        for ctl in self.controls:
+            ctl.report_wait_times()
+            ctl.close_driver()
+        self.controls = []
+        self.idle_controls = queue.Queue()
+
+    def cancel(self):
+        """Stop the searches: pending ones won't start, and running ones
+        stop after the page they are loading"""
+        self.cancel_event.set()
+
+    #####################################
+    ##Scrape keywords using the workers of the pool
+    def scrape_keyword(self, keyword, date_limit):
+        """Scrape the pages of a keyword with a leased control, from the
+        last checkpoint if the search was started in a previous run.
+        Returns a list of (x_paths, page_source, page, url) tuples (the
+        xPaths can change between controls), and if the search was
+        completed. Pages loaded before an error (a driver crash or an
+        unexpected page) are kept, and the search is resumed after them in
+        the next run. Pages are buffered until the search ends, so they
+        reach the pipeline and the checkpoint one keyword at a time"""
+        site = self.param.get('site')
+        resume = self.checkpoint.get_resume(site, keyword, date_limit)
+        if self.cancel_event.is_set() or (resume and resume['done']):
+            return [], False
+        if resume:
+            print(site + ": Resuming after page ", resume['page'], keyword)
+        ctl = self.lease_control()
+        pages = []
+        complete = False
+        try:
+            for page, url, page_source in ctl.scrape_webpage(
+                    keyword, date_limit,
+                    lambda page_source: (ctl.page, ctl.page_url, page_source),
+                    resume) or []:
+                pages.append((dict(ctl.x_paths), page_source, page, url))
+            complete = not self.cancel_event.is_set()
+        except WebDriverException as error:
+            print(site + ": Driver error, the search will be resumed: ",
+                  keyword, error.msg)
+            ctl.close_driver()
+        except Exception as error: #pylint: disable=broad-except
+            #Other keywords of the site keep running
+            print(site + ": Search error, the search will be resumed: ",
+                  keyword, repr(error))
+        finally:
+            self.release_control(ctl)
+        if self.page_archive:
+            for x_paths, page_source, page, url in pages:
+                self.page_archive.save_page(site, keyword, page, page_source,
+                                            x_paths)
+        return pages, complete
+
+    def process_pages(self, keyword, date_limit, function, pages, complete):
+        """Apply the page function to the pages of a keyword, recording
+        each page in the checkpoint once it has been processed"""
+        site = self.param.get('site')
+        for x_paths, page_source, page, url in pages:
+            yield function(page_source, x_paths, keyword, page)
+            self.checkpoint.save_page(site, keyword, date_limit, page, url)
+        if complete:
+            self.checkpoint.finish_search(site, keyword, date_limit)
+
+    async def multi_scrape_webpage(self, keywords, date_limit, function):
+        """Scrape a list of keywords using the workers of the pool, without
+        blocking the event loop, yielding a page based generator for each
+        keyword as soon as its search is completed. Searches still running
+        after the timeout of the site (if any) are cancelled"""
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.pool_size)
+
+        async def scrape_keyword(keyword):
+            pages, complete = await loop.run_in_executor(
+                executor, self.scrape_keyword, keyword, date_limit)
+            return keyword, pages, complete
+
+        tasks = [asyncio.ensure_future(scrape_keyword(keyword))
+                 for keyword in keywords]
+        try:
+            for task in asyncio.as_completed(tasks, timeout=self.timeout):
+                keyword, pages, complete = await task
+                yield self.process_pages(keyword, date_limit, function, pages,
+                                         complete)
+        except asyncio.TimeoutError:
+            print(self.param.get('site') + ": Timeout, searches cancelled")
+        finally:
+            self.cancel()
+            for task in tasks:
+                task.cancel()
+            #Running searches finish their page before drivers are closed,
+            #and drivers are quit in a thread, not in the event loop
+            await loop.run_in_executor(None, partial(
+                executor.shutdown, wait=True, cancel_futures=True))
+            await loop.run_in_executor(None, self.close)
+
 class WebsiteControl:
     """
     Class containing some basic website control using selenium.
     """
+    #Card elements whose class attributes define the xPaths of the card
+    #fields, for sites with varying class names (None if they are fixed)
+    card_x_paths = None
+    #Predicate of the buttons and links that are enabled
+    ENABLED_X_PATH_FILTER = ("not(@disabled) and not(@aria-disabled='true')"
+                             " and not(contains(@class, 'disabled'))"
+                             " and (@href or not(self::a))")
     #####################################
     ##Initialize instance of class
     def __init__(self, **kwargs):
         #General arguments
         self.headless = kwargs.get('headless', True)
         self.driver = None
+        self.waiter = None
         self.extras_attended = False
+        #Client of the driver daemon (None to always start a browser), and
+        #the session leased from it
+        self.daemon = None
+        self.session = None
+        self.blocker = None
         #Site specific arguments
         self.x_paths = None
         self.allowed_date_lims = None
+        self.domain = None
+        self.http_fetch = False
         #Search specific arguments
         self.max_pages = kwargs.get('max_pages', 2)
+        #Max pages of each keyword given by the query planner (max_pages for
+        #the others)
+        self.page_budgets = kwargs.get('page_budgets') or dict()
+        self.date_limit = None
+        self.seen_links = SeenLinkIndex()
+        self.xpath_cache = XPathCache()
+        self.cancel_event = threading.Event()
+        self.metrics = CrawlMetrics()
+        self.keyword = None
+        self.page = None
+        self.page_url = None
+        #Tabs loading pages at the same time (1 loads them one by one)
+        self.tabs = max(1, kwargs.get('tabs', 1))
+        self.num_pages = 0
+        #Results shown in each page, to get the number of pages
+        self.results_per_page = 20
         self.msg_print = ""
 
     #####################################
@@ -73,45 +285,75 @@ class WebsiteControl:
         """Get URL with search results"""
         raise NotImplementedError()
 
+    def get_page_url(self, keywords, date_limit, page):
+        """Get URL of a given page (starting from 1) of search results"""
+        raise NotImplementedError()
+
     #####################################
     ##Open driver, load URL and attend extras
     def open_driver(self):
-        """Open selenium chromedriver"""
+        """Open selenium chromedriver, attached to a warm session of the
+        driver daemon if one can be leased"""
         options = Options()
-        options.headless = self.headless
-        user_agent = prc.USER_AGENT
-        options.add_argument('--window-size=1920,1080')
-        options.add_argument('--disable-infobars')
-        options.add_argument(f'user-agent={user_agent}')
-        options.add_argument("--log-level=3")
+        blocking = prc.RESOURCE_BLOCKING.get(self.msg_print, {})
+        self.session = self.daemon.lease(self.msg_print) if self.daemon else None
+        if self.session:
+            options.add_experimental_option(
+                "debuggerAddress", self.session['debugger_address'])
+            self.extras_attended = self.session['extras_attended']
+        else:
+            self.extras_attended = False
+            options.headless = self.headless
+            user_agent = prc.USER_AGENT
+            options.add_argument('--window-size=1920,1080')
+            options.add_argument('--disable-infobars')
+            options.add_argument(f'user-agent={user_agent}')
+            options.add_argument("--log-level=3")
+            options.add_experimental_option(
+                "prefs", get_chrome_prefs(blocking.get('types', ())))
         self.driver = webdriver.Chrome(prc.CHROMEDRIVER_PATH,
                                        options=options)
+        if blocking:
+            self.blocker = ResourceBlocker(self.driver,
+                                           blocking.get('types', ()),
+                                           blocking.get('allowed_domains'))
+            if not self.blocker.enable():
+                self.blocker = None
+        if self.waiter:
+            self.waiter.driver = self.driver
+        else:
+            self.waiter = ReadinessWaiter(
+                self.driver, prc.WAIT_BUDGETS.get(self.msg_print))
 
     def wait_for_element(self, x_path, **kwargs):
-        """Wait for element defined by x_path"""
-        wait_seconds = kwargs.get("wait_seconds", 10)
-        check_clickable = kwargs.get("check_clickable", False)
-        try:
-            if not check_clickable:
-                WebDriverWait(self.driver, wait_seconds).until(
-                    EC.presence_of_element_located((By.XPATH, x_path)))
-            else:
-                WebDriverWait(self.driver, wait_seconds).until(
-                    EC.element_to_be_clickable((By.XPATH, x_path)))
-        except TimeoutException:
-            return False
-        else:
-            return True
+        """Wait for element defined by x_path. The wait time comes from the
+        site budget unless wait_seconds is given"""
+        condition = ('clickable' if kwargs.pop("check_clickable", False)
+                     else 'presence')
+        return self.waiter.wait_for_element(x_path, condition, **kwargs)
+
+    def wait_for_dom_idle(self, x_path=None, **kwargs):
+        """Wait for the DOM (around the first node of x_path, if given) to
+        settle, where a fixed sleep was used"""
+        return self.waiter.wait_for_dom_idle(x_path, **kwargs)
 
     def load_search_results(self, results_url):
         """Load webpage with the URL, wait for results and
         attend extras if needed"""
-        if not self.driver:
-            self.open_driver()
-        self.driver.get(results_url)
-        num_results = self.get_number_results()
-        print(self.msg_print + ": Number of results for search: ", num_results)
-        self.attend_extras()
+        with self.metrics.span('load_search_results', self.msg_print,
+                               self.keyword):
+            if not self.driver:
+                with self.metrics.span('open_driver', self.msg_print,
+                                       self.keyword):
+                    self.open_driver()
+            self.driver.get(results_url)
+            num_results = self.get_number_results()
+            self.num_pages = self.get_number_pages(num_results)
+            print(self.msg_print + ": Number of results for search: ",
+                  num_results)
+            with self.metrics.span('attend_extras', self.msg_print,
+                                   self.keyword):
+                self.attend_extras()
         return num_results != 0
 
     #Override following
@@ -128,50 +370,245 @@ class WebsiteControl:
     def get_page_data(self):
         """Get the raw data (page source) from a page of results"""
         page_source = None
-        if self.wait_for_page_load():
+        with self.metrics.span('wait_for_page_load', self.msg_print,
+                               self.keyword):
+            page_loaded = self.wait_for_page_load()
+        if page_loaded:
             page_source = self.driver.page_source
+        if self.blocker:
+            page_bytes = self.blocker.get_page_bytes()
+            print(self.msg_print + ": Page KB loaded: ", page_bytes//1024)
+            self.metrics.increment('page_bytes', self.msg_print, self.keyword,
+                                   page_bytes)
         return page_source
 
-    def get_all_pages(self, function):
+    def get_all_pages(self, function, count = 1):
         """Get all pages from one loaded keyword search, yielding a
-        page based generator"""
-        count = 1
-        while count <= self.max_pages:
+        page based generator. count is the number of the loaded page"""
+        if self.tabs > 1:
+            yield from self.get_all_pages_in_tabs(function, count)
+            return
+        while (count <= self.get_max_pages(self.keyword)
+               and not self.cancel_event.is_set()):
+            self.page = count
             print(self.msg_print + ": Scraping page: ", count)
-            yield function(self.get_page_data())
-            if self.load_next_page():
+            page_data = self.get_page_data()
+            self.page_url = self.driver.current_url
+            self.metrics.increment('pages', self.msg_print, self.keyword)
+            yield function(page_data)
+            if self.is_last_useful_page(page_data, self.date_limit):
+                print(self.msg_print + ": No newer results after page: ", count)
+                break
+            with self.metrics.span('load_next_page', self.msg_print,
+                                   self.keyword):
+                next_page_loaded = self.load_next_page()
+            if next_page_loaded:
                 count += 1
             else:
                 break
 
+    #####################################
+    ##Load pages in several tabs of the browser
+    def open_tabs(self):
+        """Open the extra tabs, with the same resource blocking. Returns
+        the handles of every tab, the current one first"""
+        handles = [self.driver.current_window_handle]
+        for _ in range(self.tabs - 1):
+            self.driver.switch_to.new_window('tab')
+            if self.blocker:
+                self.blocker.enable()
+            handles.append(self.driver.current_window_handle)
+        self.driver.switch_to.window(handles[0])
+        return handles
+
+    def close_tabs(self, handles):
+        """Close the extra tabs and go back to the first one"""
+        try:
+            for handle in handles[1:]:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(handles[0])
+        except WebDriverException:
+            #The browser crashed, it will be closed by close_driver
+            pass
+
+    def dispatch_page(self, handle, page):
+        """Start loading a page in a tab, without waiting for it. Returns
+        the time origin of the document it replaces"""
+        self.driver.switch_to.window(handle)
+        return self.driver.execute_script(
+            "var timeOrigin = performance.timeOrigin;"
+            "window.location.href = arguments[0];"
+            "return timeOrigin;",
+            self.get_page_url(self.keyword, self.date_limit, page))
+
+    def is_tab_loaded(self, handle, time_origin):
+        """Check if a tab finished loading a new document: the previous
+        one (time_origin, None if it is the one wanted) stays complete
+        until the new one is committed"""
+        self.driver.switch_to.window(handle)
+        try:
+            ready, current_origin = self.driver.execute_script(
+                "return [document.readyState === 'complete',"
+                " performance.timeOrigin];")
+        except WebDriverException:
+            return False
+        return ready and (time_origin is None or current_origin != time_origin)
+
+    def harvest_tab(self, handle, page, dispatched_at, time_origin):
+        """Get the page data and URL of a tab once its page is loaded, or
+        None while it is loading. Pages out of their wait budget are loaded
+        again in the tab, waiting for them"""
+        if not self.is_tab_loaded(handle, time_origin):
+            waited = time.monotonic() - dispatched_at
+            if waited <= self.waiter.budgets['element']:
+                return None
+            print(self.msg_print + ": Tab didn't load, loading page again: ",
+                  page)
+            self.driver.get(self.get_page_url(self.keyword, self.date_limit,
+                                              page))
+        return self.get_page_data(), self.driver.current_url
+
+    def get_all_pages_in_tabs(self, function, count = 1):
+        """Get all pages from one loaded keyword search, loading their URLs
+        in several tabs at the same time. Pages are harvested as their tab
+        finishes, and yielded in order (so the checkpoint stays valid)"""
+        handles = self.open_tabs()
+        last_page = min(self.get_max_pages(self.keyword), self.num_pages)
+        loading = {handles[0]: (count, time.monotonic(), None)}
+        loaded = dict()
+        next_page = count + 1
+        try:
+            while count <= last_page and not self.cancel_event.is_set():
+                for handle in handles:
+                    if handle not in loading and next_page <= last_page:
+                        time_origin = self.dispatch_page(handle, next_page)
+                        loading[handle] = (next_page, time.monotonic(),
+                                           time_origin)
+                        next_page += 1
+                for handle, (page, *tab_state) in list(loading.items()):
+                    page_data = self.harvest_tab(handle, page, *tab_state)
+                    if page_data is not None:
+                        loaded[page] = page_data
+                        del loading[handle]
+                while count in loaded and count <= last_page:
+                    page_data, self.page_url = loaded.pop(count)
+                    self.page = count
+                    print(self.msg_print + ": Scraping page: ", count)
+                    self.metrics.increment('pages', self.msg_print,
+                                           self.keyword)
+                    yield function(page_data)
+                    if self.is_last_useful_page(page_data, self.date_limit):
+                        print(self.msg_print + ": No newer results after page: ",
+                              count)
+                        last_page = count
+                    count += 1
+                if loading and count not in loaded:
+                    time.sleep(self.waiter.budgets['poll'])
+        finally:
+            self.close_tabs(handles)
+
+    def is_last_useful_page(self, page_source, date_limit):
+        """Check if every card in the page is older than the date limit or
+        was already known when the crawl started (v1's breakPageLoop), so
+        next pages can be skipped. Results are sorted by date in every
+        site"""
+        if not page_source:
+            return False
+        cleaner = select_data_cleaner(self.msg_print)
+        lim_date = datetime.now().date() - timedelta(days = date_limit)
+        all_old = all_known = True
+        cards = extract_cards(page_source, self.x_paths)
+        for card in cards:
+            try:
+                date = cleaner.clean_date(card['date'])
+                link = cleaner.clean_link(card['link'])
+            except (IndexError, KeyError, ValueError, TypeError):
+                return False
+            all_old = all_old and date is not None and date < lim_date
+            all_known = all_known and self.seen_links.was_known(link)
+            if not (all_old or all_known):
+                return False
+        return bool(cards)
+
+    def get_max_pages(self, keyword):
+        """Get the max number of pages to load for a keyword"""
+        return self.page_budgets.get(keyword, self.max_pages)
+
+    def get_number_pages(self, num_results):
+        """Get the number of pages of a search, up to the max pages of the
+        keyword"""
+        return min(self.get_max_pages(self.keyword),
+                   -(-num_results//self.results_per_page))
+
+    def get_page_urls(self, keywords, date_limit, num_results):
+        """Get the URLs of every page of a search, so they can be loaded
+        in any order"""
+        return [self.get_page_url(keywords, date_limit, page)
+                for page in range(1, self.get_number_pages(num_results) + 1)]
+
     #Override following
     def wait_for_page_load(self):
         """Wait for page load based on some condition"""
         raise NotImplementedError()
 
     def load_next_page(self):
-        """Load next page if exists. Pd: This doesn't wait for load."""
-        raise NotImplementedError()
+        """Load next page if exists, from its URL. Pd: This doesn't wait
+        for load."""
+        if self.page is None or self.page >= self.num_pages:
+            return False
+        self.driver.get(self.get_page_url(self.keyword, self.date_limit,
+                                          self.page + 1))
+        return True
 
     #####################################
     ##Methods that group all the control
-    def scrape_webpage(self, keyword, date_limit, function):
-        """Scrape a single keyword from one of the webpages"""
-        url = self.get_search_url(keyword, date_limit)
+    def scrape_webpage(self, keyword, date_limit, function, resume = None):
+        """Scrape a single keyword from one of the webpages. With a
+        checkpoint entry to resume from, the scrape starts at the page
+        after it"""
+        first_page = resume['page'] + 1 if resume else 1
+        url = self.get_page_url(keyword, date_limit, first_page)
+        self.date_limit = date_limit
+        self.keyword = keyword
         page_data = None
         if self.load_search_results(url):
             self.update_xpaths()
-            page_data = self.get_all_pages(function)
+            page_data = self.get_all_pages(function, first_page)
         return page_data
 
     def multi_scrape_webpage(self, keywords, date_limit, function):
         """Scrape a list of keywords without closing the driver"""
         for keyword in keywords:
             yield self.scrape_webpage(keyword, date_limit, function)
-        self.driver.close()
+        self.close_driver()
+
+    def close_driver(self):
+        """Quit the driver. A browser leased from the daemon keeps running
+        and is returned with its state (the daemon recycles it if it uses
+        too much memory or crashed)"""
+        if not self.driver:
+            return
+        crashed = False
+        try:
+            #Chromedriver doesn't close browsers it didn't launch
+            self.driver.quit()
+        except WebDriverException:
+            crashed = True
+        if self.session:
+            self.daemon.release(self.session['session_id'],
+                                self.extras_attended, crashed)
+            self.session = None
+        self.driver = None
 
     #####################################
     ##Extra methods
+    def report_wait_times(self):
+        """Print the time spent in each kind of readiness wait"""
+        if self.waiter:
+            print(self.msg_print + ": Wait times: ",
+                  self.waiter.get_wait_summary())
+
     def unroll_generator(self, generator):
         """Function to unroll the results of the yielded generator
         in multi_scrape_webpage"""
@@ -180,9 +617,52 @@ class WebsiteControl:
             for item in generator_pg:
                 yield item
 
-    def update_xpaths(self):
-        """Function that deals with varying xPaths for scraped data"""
-        raise NotImplementedError()
+    def update_xpaths(self, page_source=None):
+        """Function that deals with varying xPaths for scraped data. Cached
+        xPaths are reused while the structure of the cards doesn't change,
+        so they are only discovered again when it does (or when extraction
+        fails and the cache is invalidated). Uses the driver page source if
+        none is given"""
+        if not self.card_x_paths:
+            return
+        if page_source is None:
+            page_source = self.driver.page_source
+        fingerprint = get_structure_fingerprint(page_source,
+                                                self.x_paths['cards'],
+                                                self.card_x_paths)
+        cached_x_paths = self.xpath_cache.get(self.msg_print, fingerprint)
+        if cached_x_paths:
+            self.x_paths.update(cached_x_paths)
+        elif self.discover_xpaths(page_source):
+            self.xpath_cache.put(self.msg_print, fingerprint,
+                                 {key: self.x_paths[key]
+                                  for key in CARD_FIELDS})
+
+    def discover_xpaths(self, page_source):
+        """Update card xPaths with the class attributes of the first card
+        that has every element of card_x_paths. Returns if one was found"""
+        cards = Selector(text=page_source).xpath(self.x_paths['cards'])
+        for card in cards:
+            class_values = {key: card.xpath(value + "/@class").get()
+                            for key, value in self.card_x_paths.items()}
+            if None in class_values.values():
+                continue
+            for key, value in class_values.items():
+                self.set_card_xpath(key, value)
+            return True
+        return False
+
+    def set_card_xpath(self, key, class_values):
+        """Update the xPath of a card field from its class attribute"""
+        self.x_paths[key] = ".//*[contains(@class, '{}')]/text()".format(class_values)
+
+    def has_next_page(self, page_source):
+        """Check if the page source has an enabled next page button. Sites
+        render a disabled one in the last page (a link without href, or
+        with a disabled attribute or class)"""
+        x_path = "({})[{}]".format(self.x_paths['next_btn'],
+                                   self.ENABLED_X_PATH_FILTER)
+        return bool(Selector(text=page_source).xpath(x_path))
 
 class BumeranControl(WebsiteControl):
     """Class for getting raw data from multiple pages in Bumeran
@@ -204,6 +684,7 @@ class BumeranControl(WebsiteControl):
                         'date': "",
                         'link': ".//a/@href"}
         self.allowed_date_lims = [1, 3, 7, 15, 30]
+        self.domain = "bumeran.com.pe"
         self.msg_print = "Bumeran"
 
     #####################################
@@ -236,12 +717,19 @@ class BumeranControl(WebsiteControl):
         url_r = self.get_keyword_url_string(keywords) + url_base_3
         return url_l + url_r
 
+    def get_page_url(self, keywords, date_limit, page):
+        """Get URL of a given page (starting from 1) of search results"""
+        url = self.get_search_url(keywords, date_limit)
+        if page > 1:
+            url += "&page=" + str(page)
+        return url
+
     #####################################
     ##Open driver, load URL and attend extras
     def get_number_results(self):
         """Get the number of results when a search is loaded"""
-        time.sleep(1)
         self.wait_for_element(self.x_paths['num_jobs'])
+        self.wait_for_dom_idle(self.x_paths['cards'])
         result_string = self.driver.find_element_by_xpath(
             self.x_paths['num_jobs']).text
         result_string = result_string.replace(",", "")
@@ -252,9 +740,9 @@ class BumeranControl(WebsiteControl):
         """Attend extras. In this case, close the survey"""
         if not self.extras_attended:
             if self.wait_for_element(self.x_paths['review_btn'],
-                                     wait_seconds=15,
+                                     budget='extras',
                                      check_clickable=True):
-                time.sleep(1)
+                self.wait_for_dom_idle()
                 survey_btn = self.driver.find_element_by_xpath(
                     self.x_paths['review_btn'])
                 survey_btn.click()
@@ -266,41 +754,17 @@ class BumeranControl(WebsiteControl):
         """Wait for page load based on some condition"""
         return self.wait_for_element(self.x_paths['next_btn'])
 
-    def load_next_page(self):
-        """Load next page if exists. Pd: This doesn't wait for load."""
-        button_list = self.driver.find_elements_by_xpath(
-            self.x_paths['next_btn'])
-        if button_list:
-            button = button_list[0]
-            if button.is_enabled():
-                button.click()
-                return True
-        return False
-
     #####################################
     ##Methods that group all the control
 
     #####################################
     ##Extra methods
-    def update_xpaths(self):
-        """Function that deals with varying xPaths for scraped data"""
-        #Card structure up to check date
-        x_paths_tmp = {
-            'job': "(./a/div/*)[1]//h2",
-            'company': "(./a/div/*)[1]//h3",
-            'location': "((./a/div/*)[2]//h3)[1]",
-            'date': "((./a/div/*)[1]//h3)[3]"}
-        #Update xPaths with help of card structure
-        cards = self.driver.find_elements_by_xpath(self.x_paths['cards'])
-        for card in cards:
-            try:
-                for key, value in x_paths_tmp.items():
-                    class_values = card.find_element_by_xpath(value).get_attribute('class')
-                    self.x_paths[key] = ".//*[contains(@class, '{}')]/text()".format(class_values)
-            except NoSuchElementException:
-                continue
-            else:
-                break
+    #Card structure up to check date
+    card_x_paths = {
+        'job': "(./a/div/*)[1]//h2",
+        'company': "(./a/div/*)[1]//h3",
+        'location': "((./a/div/*)[2]//h3)[1]",
+        'date': "((./a/div/*)[1]//h3)[3]"}
 
 class ComputrabajoControl(WebsiteControl):
     """Class for getting all raw data from multiple pages in Computrabajo
@@ -323,6 +787,8 @@ class ComputrabajoControl(WebsiteControl):
                         'date': "",
                         'link': ""}
         self.allowed_date_lims = [1, 3, 7, 15, 30]
+        self.domain = "computrabajo.com.pe"
+        self.http_fetch = True
         self.msg_print = "Computrabajo"
 
     #####################################
@@ -348,12 +814,19 @@ class ComputrabajoControl(WebsiteControl):
         url_3 = self.get_date_limit_url_string(date_limit)
         return url_1 + url_2 + url_3
 
+    def get_page_url(self, keywords, date_limit, page):
+        """Get URL of a given page (starting from 1) of search results"""
+        url = self.get_search_url(keywords, date_limit)
+        if page > 1:
+            url += "&p=" + str(page)
+        return url
+
     #####################################
     ##Open driver, load URL and attend extras
     def get_number_results(self):
         """Get the number of results when a search is loaded"""
-        time.sleep(1)
         self.wait_for_element(self.x_paths['num_jobs'])
+        self.wait_for_dom_idle(self.x_paths['cards'])
         result_string = self.driver.find_element_by_xpath(
             self.x_paths['num_jobs']).text
         result_string = result_string.replace(".", "")
@@ -366,8 +839,10 @@ class ComputrabajoControl(WebsiteControl):
     def attend_extras(self):
         """Attend extras. In this case, accept cookies"""
         if not self.extras_attended:
-            if self.wait_for_element(self.x_paths['cookies_btn']):
-                time.sleep(1)
+            if self.wait_for_element(self.x_paths['cookies_btn'],
+                                     budget='extras',
+                                     check_clickable=True):
+                self.wait_for_dom_idle()
                 cookies_btn = self.driver.find_element_by_xpath(
                     self.x_paths['cookies_btn'])
                 cookies_btn.click()
@@ -379,45 +854,25 @@ class ComputrabajoControl(WebsiteControl):
         """Wait for page load based on some condition"""
         return self.wait_for_element(self.x_paths['cards'])
 
-    def load_next_page(self):
-        """Load next page if exists. Pd: This doesn't wait for load."""
-        button_list = self.driver.find_elements_by_xpath(
-            self.x_paths['next_btn'])
-        if button_list:
-            button = button_list[0]
-            if button.is_enabled():
-                button.click()
-                return True
-        return False
-
     #####################################
     ##Methods that group all the control
 
     #####################################
     ##Extra methods
-    def update_xpaths(self):
-        """Function that deals with varying xPaths for scraped data"""
-        #Card structure up to check date
-        x_paths_tmp = {
-            'job': ".//h1/a",
-            'company': "//article/div/p[1]",
-            'location': "//article/div/p[1]",
-            'date': "//article/div/p[3]"}
-        #Update xPaths with help of card structure
-        cards = self.driver.find_elements_by_xpath(self.x_paths['cards'])
-        for card in cards:
-            try:
-                for key, value in x_paths_tmp.items():
-                    class_values = card.find_element_by_xpath(value).get_attribute('class')
-                    self.x_paths[key] = ".//*[contains(@class, '{}')]/text()".format(class_values)
-                    if key == 'company' or key == 'location':
-                        self.x_paths[key] = ".//*[contains(@class, '{}')]//text()".format(class_values)
-                    if key == 'job':
-                        self.x_paths['link'] = ".//*[contains(@class, '{}')]/@href".format(class_values)
-            except NoSuchElementException:
-                continue
-            else:
-                break
+    #Card structure up to check date
+    card_x_paths = {
+        'job': ".//h1/a",
+        'company': "//article/div/p[1]",
+        'location': "//article/div/p[1]",
+        'date': "//article/div/p[3]"}
+
+    def set_card_xpath(self, key, class_values):
+        """Update the xPath of a card field from its class attribute"""
+        self.x_paths[key] = ".//*[contains(@class, '{}')]/text()".format(class_values)
+        if key == 'company' or key == 'location':
+            self.x_paths[key] = ".//*[contains(@class, '{}')]//text()".format(class_values)
+        if key == 'job':
+            self.x_paths['link'] = ".//*[contains(@class, '{}')]/@href".format(class_values)
 
 class IndeedControl(WebsiteControl):
     """Class for getting all raw data from multiple pages in Indeed
@@ -444,6 +899,9 @@ class IndeedControl(WebsiteControl):
                         'date': ".//span[contains(@class,'date')]/text()",
                         'link': "./@href"}
         self.allowed_date_lims = [1, 3, 7, 14]
+        self.domain = "indeed.com"
+        self.http_fetch = True
+        self.results_per_page = 10
         self.msg_print = "Indeed"
 
     #####################################
@@ -468,12 +926,19 @@ class IndeedControl(WebsiteControl):
         url_d = self.get_date_limit_url_string(date_limit)
         return url_1 + url_k + url_d + url_2
 
+    def get_page_url(self, keywords, date_limit, page):
+        """Get URL of a given page (starting from 1) of search results"""
+        url = self.get_search_url(keywords, date_limit)
+        if page > 1:
+            url += "&start=" + str(10*(page - 1))
+        return url
+
     #####################################
     ##Open driver, load URL and attend extras
     def get_number_results(self):
         """Get the number of results when a search is loaded"""
-        time.sleep(1)
         self.wait_for_element(self.x_paths['num_jobs'])
+        self.wait_for_dom_idle(self.x_paths['cards'])
         result = self.driver.find_elements_by_xpath(self.x_paths['num_jobs'])
         #result_string = result_string.replace(".", "")
         num_results = 0
@@ -492,7 +957,7 @@ class IndeedControl(WebsiteControl):
             element = button_list[0]
             if element.is_displayed() and element.is_enabled():
                 element.click()
-                time.sleep(1)
+                self.wait_for_dom_idle()
         button_list = self.driver.find_elements_by_xpath(
             self.x_paths['email_popup'])
         if button_list:
@@ -500,19 +965,12 @@ class IndeedControl(WebsiteControl):
             self.wait_for_element_display(self.x_paths['email_popup'])
             if element.is_displayed():
                 element.click()
-                time.sleep(1)
+                self.wait_for_dom_idle()
                 self.driver.refresh()
 
     def wait_for_element_display(self, x_path, **kwargs):
         """Wait for element defined by x_path - Display"""
-        wait_seconds = kwargs.get("wait_seconds", 10)
-        try:
-            WebDriverWait(self.driver, wait_seconds).until(
-                EC.visibility_of_element_located((By.XPATH, x_path)))
-        except TimeoutException:
-            return False
-        else:
-            return True
+        return self.waiter.wait_for_element(x_path, 'visible', **kwargs)
 
     #####################################
     ##Return page data and loop through pages until max page number
@@ -521,24 +979,14 @@ class IndeedControl(WebsiteControl):
         return self.wait_for_element(self.x_paths['cards'])
 
     def load_next_page(self):
-        """Load next page if exists. Pd: This doesn't wait for load."""
+        """Load next page if exists, after closing the popups. Pd: This
+        doesn't wait for load."""
         self.attend_extras()
-        button_list = self.driver.find_elements_by_xpath(
-            self.x_paths['next_btn'])
-        if button_list:
-            button = button_list[0]
-            if button.is_enabled():
-                button.click()
-                return True
-        return False
+        return super().load_next_page()
 
     #####################################
     ##Methods that group all the control
 
     #####################################
     ##Extra methods
-    def update_xpaths(self):
-        """Function that deals with varying xPaths for scraped data"""
-        #self.x_paths = self.x_paths
-        None
     
\ No newline at end of file
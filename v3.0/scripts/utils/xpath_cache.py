@@ -0,0 +1,114 @@
+"""
+On disk cache of the card xPaths discovered for each site
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from lxml import etree
+
+def get_structure_fingerprint(page_source, cards_x_path, element_x_paths,
+                              num_cards=3):
+    """Hash of the tags and classes of the card elements that define the
+    xPaths (element_x_paths, by card field), in the first cards that have
+    all of them. It changes when the site changes the class names of those
+    elements, but not with optional badges or promo cards"""
+    root = etree.HTML(page_source) if page_source else None
+    if root is None:
+        return None
+    signature = list()
+    num_found = 0
+    for card in root.xpath(cards_x_path):
+        elements = [card.xpath(element_x_paths[key])
+                    for key in sorted(element_x_paths)]
+        if not all(elements):
+            continue
+        signature += ["{}.{}".format(element[0].tag,
+                                     element[0].get('class', ''))
+                      for element in elements]
+        num_found += 1
+        if num_found == num_cards:
+            break
+    if not signature:
+        return None
+    return hashlib.sha1("|".join(signature).encode('utf-8')).hexdigest()
+
+class XPathCache:
+    """
+    Cache of discovered card xPaths by site, stored as JSON with the
+    fingerprint of the page structure they were discovered from. Entries
+    expire after a TTL, or when invalidated because extraction failed.
+    """
+    #####################################
+    ##Initialize instance of class
+    def __init__(self, path=None, ttl_hours=24):
+        self.path = path
+        self.ttl_seconds = ttl_hours*3600
+        self.entries = dict()
+        self.lock = threading.Lock()
+
+    #####################################
+    ##Load and save cache
+    @classmethod
+    def read_entries(cls, path):
+        """Read the entries stored on disk, if any"""
+        entries = dict()
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    entries = json.load(file)
+            except ValueError:
+                entries = dict()
+        return entries
+
+    @classmethod
+    def load(cls, path, ttl_hours=24):
+        """Load the cache from disk. Returns an empty one if the file
+        doesn't exist or can't be read"""
+        cache = cls(path, ttl_hours)
+        cache.entries = cls.read_entries(path)
+        return cache
+
+    def save(self, site):
+        """Write the entry of a site to disk, keeping the entries of other
+        sites that could be saved by other spiders (nothing is saved
+        without a path)"""
+        if not self.path:
+            return
+        entries = self.read_entries(self.path)
+        if site in self.entries:
+            entries[site] = self.entries[site]
+        else:
+            entries.pop(site, None)
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(entries, file, indent=1)
+
+    #####################################
+    ##Get, put and invalidate entries
+    def get(self, site, fingerprint):
+        """Get cached xPaths of a site if the fingerprint matches and they
+        haven't expired"""
+        with self.lock:
+            entry = self.entries.get(site)
+        if (fingerprint is None or entry is None
+                or entry['fingerprint'] != fingerprint
+                or time.time() - entry['updated'] > self.ttl_seconds):
+            return None
+        return dict(entry['x_paths'])
+
+    def put(self, site, fingerprint, x_paths):
+        """Store discovered xPaths of a site"""
+        if fingerprint is None:
+            return
+        with self.lock:
+            self.entries[site] = {'fingerprint': fingerprint,
+                                  'x_paths': dict(x_paths),
+                                  'updated': time.time()}
+            self.save(site)
+
+    def invalidate(self, site):
+        """Forget the xPaths of a site, so they are discovered again"""
+        with self.lock:
+            if self.entries.pop(site, None) is not None:
+                self.save(site)